@@ -1,11 +1,13 @@
 """MycelianMemoryAgent - Clean implementation following the control-based protocol."""
 
 import asyncio
+import functools
 import json
 import logging
+import os
 import uuid
 from datetime import datetime
-from typing import TypedDict, Annotated, Sequence, Optional, Union, Dict, Any, List
+from typing import TypedDict, Annotated, Sequence, Optional, Dict, Any, List, Callable
 from typing_extensions import TypedDict
 
 from langchain_core.messages import BaseMessage, AIMessage, ToolMessage, ChatMessage
@@ -46,11 +48,27 @@ ALLOWED_TOOLS = {
 }
 
 
+# Completion markers appended to tool_history. They are never mutated, so each
+# observe() step reuses one instance instead of building and validating a new AIMessage
+_MESSAGE_ACCUMULATED = AIMessage(content="Message accumulated (context-only).")
+_MESSAGE_PROCESSED = AIMessage(content="Message processed.")
+_FLUSH_SKIPPED = AIMessage(content="Flush skipped (context-only).")
+_FLUSHED = AIMessage(content="Flushed to context.")
+_SESSION_ENDED = AIMessage(content="Session ended.")
+_SESSION_STARTED = AIMessage(content="Session started.")
+
+
+def _tool_message_fingerprint(msg: ToolMessage) -> tuple:
+    """Identity of a tool result for de-duplication: same call, tool, status and payload."""
+    content = msg.content if isinstance(msg.content, str) else json.dumps(msg.content, default=str)
+    return (msg.tool_call_id, msg.name, msg.status, content)
+
+
 class AgentState(TypedDict):
     """State structure for the agent."""
     conversation_history: Annotated[Sequence[ChatMessage], add_messages]  # Accumulates across invocations
     to_process: Sequence[ChatMessage]  # Current ChatMessage to process (replaced each invocation)
-    tool_history: Sequence[Union[AIMessage, ToolMessage]]  # Tool flow for current invocation (not checkpointed)
+    tool_history: Sequence[BaseMessage]  # Tool flow for current invocation (not checkpointed); observe returns tuples
     control: ControlState  # Control state driving execution
     messages: Sequence[BaseMessage]  # Tool I/O buffer for ToolNode (per-invocation only, no accumulation)
 
@@ -81,6 +99,8 @@ class MycelianMemoryAgent:
         self.vault_id = vault_id
         self.memory_id = memory_id
         self.context_only = context_only
+        # Reuses formatted messages across prompt builds within this agent's session
+        self._format_history = HistoryFormatter()
         self.logger = logger or logging.getLogger(f"{DEFAULT_AGENT_LOGGER}.{memory_id}")
         try:
             self.logger.info(json.dumps({
@@ -156,6 +176,53 @@ class MycelianMemoryAgent:
         self._log_llm_tool_calls(response, invocation_id)
         return response
 
+    def _log_llm_input(self, purpose: str, llm_messages: List[Dict[str, str]]) -> None:
+        """Log the full message array sent to the model.
+
+        The prompts are large, so serialization is skipped entirely when INFO is disabled.
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        event = {
+            "event": "llm_input_messages_full",
+            "timestamp": datetime.utcnow().isoformat(),
+            "purpose": purpose,
+            "memory_id": self.memory_id,
+            "vault_id": self.vault_id,
+            "messages_count": len(llm_messages),
+            "messages": llm_messages
+        }
+        try:
+            self.logger.info(json.dumps(event))
+        except (TypeError, ValueError):
+            # Fallback: omit messages if they are not JSON serializable in unexpected cases
+            del event["messages"]
+            self.logger.info(json.dumps(event))
+
+    def _add_entry_llm_messages(self, conversation_history: Sequence[ChatMessage],
+                                message: ChatMessage) -> List[Dict[str, str]]:
+        """Build (and log) the LLM input for one add_entry call."""
+        self.logger.info(json.dumps({
+                "event": "llm_call",
+                "timestamp": datetime.utcnow().isoformat(),
+                "purpose": "add_entry",
+                "message_role": message.role,
+                "message_preview": message.content[:200] if message.content else None
+            }))
+
+        prompt = build_add_entry_prompt(
+            conversation_history, message, self.prompts,
+            self.vault_id, self.memory_id,
+            format_history=self._format_history
+        )
+        llm_messages = [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": "Execute the required operation."}
+        ]
+        # Log the full message array being sent to the model (add_entry)
+        self._log_llm_input("add_entry", llm_messages)
+        return llm_messages
+
     def _filter_tool_calls(self, response: AIMessage, control: ControlState, last_tool: Optional[str]) -> AIMessage:
         """Filter tool calls to only allowed ones for current state.
 
@@ -231,10 +298,17 @@ class MycelianMemoryAgent:
         messages = state.get("messages", [])
 
         # Copy any new ToolMessages from messages to tool_history
-        # ToolNode adds results to messages, we need them in tool_history for tracking
+        # ToolNode adds results to messages, we need them in tool_history for tracking.
+        # Fingerprints make re-observing the same results a set lookup rather than a
+        # scan of pydantic equality checks over the whole history.
+        seen = {_tool_message_fingerprint(msg) for msg in tool_history
+                if isinstance(msg, ToolMessage)}
         for msg in messages:
-            if isinstance(msg, ToolMessage) and msg not in tool_history:
-                tool_history.append(msg)
+            if isinstance(msg, ToolMessage):
+                fingerprint = _tool_message_fingerprint(msg)
+                if fingerprint not in seen:
+                    seen.add(fingerprint)
+                    tool_history.append(msg)
 
         self.logger.info(json.dumps({
                 "event": "observe_start",
@@ -258,399 +332,356 @@ class MycelianMemoryAgent:
                     # attempt to infer errors by scanning payload text.
                     break
 
-        # START_SESSION: Create tool calls for ToolNode to execute
-        if control == ControlState.START_SESSION:
-            if last_tool is None:
-                # First tool: await_consistency to ensure previous writes are complete
-                args = {"memory_id": self.memory_id}
+        handler = self._DISPATCH.get(control)
+        result = handler(self, state, tool_history, last_tool) if handler else None
+        if result is not None:
+            return result
 
-                self.logger.info(json.dumps({
-                        "event": "creating_tool_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "tool": "await_consistency",
-                        "args": args
-                    }))
+        # Should not reach here
+        raise ValueError(f"Unexpected state: control={control}, last_tool={last_tool}")
+
+    def _observe_start_session(self, state: AgentState, tool_history: List[BaseMessage],
+                               last_tool: Optional[str]) -> Optional[Dict[str, Any]]:
+        """START_SESSION: Create tool calls for ToolNode to execute."""
+        conversation_history = state.get("conversation_history", [])
+
+        if last_tool is None:
+            # First tool: await_consistency to ensure previous writes are complete
+            args = {"memory_id": self.memory_id}
 
-                # Create AIMessage with tool_calls for ToolNode to process
-                tool_call = {
-                    "id": "await_consistency_call_start",
-                    "name": "await_consistency",
+            self.logger.info(json.dumps({
+                    "event": "creating_tool_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "tool": "await_consistency",
                     "args": args
-                }
+                }))
 
-                ai_msg = AIMessage(
-                    content="Ensuring previous session's writes are complete.",
-                    tool_calls=[tool_call]
-                )
+            # Create AIMessage with tool_calls for ToolNode to process
+            tool_call = {
+                "id": "await_consistency_call_start",
+                "name": "await_consistency",
+                "args": args
+            }
 
-                # Return with updated tool_history (includes copied ToolMessages)
-                return {"tool_history": tool_history + [ai_msg], "messages": [ai_msg]}
+            ai_msg = AIMessage(
+                content="Ensuring previous session's writes are complete.",
+                tool_calls=[tool_call]
+            )
 
-            elif last_tool == "await_consistency":
-                # Second tool: get_context
-                args = {
-                    "vault_id": self.vault_id,
-                    "memory_id": self.memory_id
-                }
+            # Return with updated tool_history (includes copied ToolMessages)
+            return {"tool_history": (*tool_history, ai_msg), "messages": [ai_msg]}
 
-                self.logger.info(json.dumps({
-                        "event": "creating_tool_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "tool": "get_context",
-                        "args": args
-                    }))
+        elif last_tool == "await_consistency":
+            # Second tool: get_context
+            args = {
+                "vault_id": self.vault_id,
+                "memory_id": self.memory_id
+            }
 
-                # Create AIMessage with tool_calls for ToolNode to process
-                tool_call = {
-                    "id": "get_context_call_1",
-                    "name": "get_context",
+            self.logger.info(json.dumps({
+                    "event": "creating_tool_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "tool": "get_context",
                     "args": args
-                }
-
-                ai_msg = AIMessage(
-                    content="Retrieving stored context from previous sessions.",
-                    tool_calls=[tool_call]
-                )
+                }))
 
-                # Return with updated tool_history (includes copied ToolMessages)
-                return {"tool_history": tool_history + [ai_msg], "messages": [ai_msg]}
+            # Create AIMessage with tool_calls for ToolNode to process
+            tool_call = {
+                "id": "get_context_call_1",
+                "name": "get_context",
+                "args": args
+            }
 
-            elif last_tool == "get_context":
-                # Third tool: list_entries
-                args = {
-                    "vault_id": self.vault_id,
-                    "memory_id": self.memory_id,
-                    "limit": 10
-                }
+            ai_msg = AIMessage(
+                content="Retrieving stored context from previous sessions.",
+                tool_calls=[tool_call]
+            )
 
-                self.logger.info(json.dumps({
-                        "event": "creating_tool_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "tool": "list_entries",
-                        "args": args
-                    }))
+            # Return with updated tool_history (includes copied ToolMessages)
+            return {"tool_history": (*tool_history, ai_msg), "messages": [ai_msg]}
 
-                # Create AIMessage with tool_calls for ToolNode to process
-                tool_call = {
-                    "id": "list_entries_call_1",
-                    "name": "list_entries",
-                    "args": args
-                }
-
-                ai_msg = AIMessage(
-                    content="Fetching the 10 most recent entries.",
-                    tool_calls=[tool_call]
-                )
-
-                # Return with updated tool_history (includes copied ToolMessages)
-                return {"tool_history": tool_history + [ai_msg], "messages": [ai_msg]}
-
-            elif last_tool == "list_entries":
-                # All three tools completed, extract results and finish
-                # Find the context and entries from tool_history
-                context_text = ""
-                entries_text = ""
-
-                for msg in tool_history:
-                    if isinstance(msg, ToolMessage):
-                        if msg.name == "get_context":
-                            context_text = msg.content
-                            # Log the retrieved context content
-                            self.logger.info(json.dumps({
-                                "event": "get_context_retrieved",
-                                "timestamp": datetime.utcnow().isoformat(),
-                                "memory_id": self.memory_id,
-                                "context_length": len(context_text),
-                                "context_preview": context_text[:500] if context_text else "[empty]"
-                            }))
-                        elif msg.name == "list_entries":
-                            entries_text = msg.content
-
-                # Add retrieved context (prefixed with [previous_context]) and entries to conversation_history
-                context_msg = ChatMessage(
-                    role="system",
-                    content=f"[previous_context]\n{context_text}"
-                )
-                entries_msg = ChatMessage(
-                    role="system",
-                    content=f"Recent entries:\n{entries_text}"
-                )
-
-                # Mark complete and update conversation history
-                return {
-                    # FIX: Append to existing conversation_history instead of replacing it
-                    "conversation_history": conversation_history + [context_msg, entries_msg],
-                    # Return with updated tool_history
-                    "tool_history": tool_history + [AIMessage(content="Session started.")]
-                }
-
-        # PROCESS_MESSAGE sequence: add_entry only (or just accumulate if context_only)
-        elif control == ControlState.PROCESS_MESSAGE:
-            # If context_only mode, just add to conversation history without calling add_entry
-            if self.context_only:
-                if not to_process:
-                    raise ValueError("No message to process in PROCESS_MESSAGE state")
+        elif last_tool == "get_context":
+            # Third tool: list_entries
+            args = {
+                "vault_id": self.vault_id,
+                "memory_id": self.memory_id,
+                "limit": 10
+            }
 
-                self.logger.info(json.dumps({
-                    "event": "context_only_accumulate",
+            self.logger.info(json.dumps({
+                    "event": "creating_tool_call",
                     "timestamp": datetime.utcnow().isoformat(),
-                    "message_role": to_process[0].role if to_process else None,
-                    "message_preview": to_process[0].content[:200] if to_process and to_process[0].content else None
+                    "tool": "list_entries",
+                    "args": args
                 }))
 
-                # Just add to conversation history and return
+            # Create AIMessage with tool_calls for ToolNode to process
+            tool_call = {
+                "id": "list_entries_call_1",
+                "name": "list_entries",
+                "args": args
+            }
+
+            ai_msg = AIMessage(
+                content="Fetching the 10 most recent entries.",
+                tool_calls=[tool_call]
+            )
+
+            # Return with updated tool_history (includes copied ToolMessages)
+            return {"tool_history": (*tool_history, ai_msg), "messages": [ai_msg]}
+
+        elif last_tool == "list_entries":
+            # All three tools completed, extract results and finish
+            # Find the context and entries from tool_history
+            context_text = ""
+            entries_text = ""
+
+            for msg in tool_history:
+                if isinstance(msg, ToolMessage):
+                    if msg.name == "get_context":
+                        context_text = msg.content
+                        # Log the retrieved context content
+                        self.logger.info(json.dumps({
+                            "event": "get_context_retrieved",
+                            "timestamp": datetime.utcnow().isoformat(),
+                            "memory_id": self.memory_id,
+                            "context_length": len(context_text),
+                            "context_preview": context_text[:500] if context_text else "[empty]"
+                        }))
+                    elif msg.name == "list_entries":
+                        entries_text = msg.content
+
+            # Add retrieved context (prefixed with [previous_context]) and entries to conversation_history
+            context_msg = ChatMessage(
+                role="system",
+                content=f"[previous_context]\n{context_text}"
+            )
+            entries_msg = ChatMessage(
+                role="system",
+                content=f"Recent entries:\n{entries_text}"
+            )
+
+            # Mark complete and update conversation history
+            return {
                 # FIX: Append to existing conversation_history instead of replacing it
-                return {
-                    "conversation_history": conversation_history + to_process,
-                    "tool_history": tool_history + [AIMessage(content="Message accumulated (context-only).")]
-                }
-
-            # Normal mode: process with add_entry
-            # Only relevant tool for this state is add_entry
-            if last_tool not in [None, "add_entry"]:
-                # Ignore tools from other control states, treat as starting fresh
-                last_tool = None
-
-            if last_tool is None:
-                # Only tool: add_entry (needs LLM for summary)
-                if not to_process:
-                    raise ValueError("No message to process in PROCESS_MESSAGE state")
+                "conversation_history": conversation_history + [context_msg, entries_msg],
+                # Return with updated tool_history
+                "tool_history": (*tool_history, _SESSION_STARTED)
+            }
 
-                self.logger.info(json.dumps({
-                        "event": "llm_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "add_entry",
-                        "message_role": to_process[0].role,
-                        "message_preview": to_process[0].content[:200] if to_process[0].content else None
-                    }))
+    def _observe_process_message(self, state: AgentState, tool_history: List[BaseMessage],
+                                 last_tool: Optional[str]) -> Optional[Dict[str, Any]]:
+        """PROCESS_MESSAGE sequence: add_entry only (or just accumulate if context_only)."""
+        control = ControlState.PROCESS_MESSAGE
+        conversation_history = state.get("conversation_history", [])
+        to_process = state.get("to_process", [])
 
-                prompt = build_add_entry_prompt(
-                    conversation_history, to_process[0], self.prompts,
-                    self.vault_id, self.memory_id
-                )
-                llm_messages = [
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": "Execute the required operation."}
-                ]
-                # Log the full message array being sent to the model (add_entry)
-                try:
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "add_entry",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages),
-                        "messages": llm_messages
-                    }))
-                except (TypeError, ValueError):
-                    # Fallback: omit messages if they are not JSON serializable in unexpected cases
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "add_entry",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages)
-                    }))
-                response = self._invoke_llm_with_retry(llm_messages)
-                # Filter tool calls to only allowed ones
-                response = self._filter_tool_calls(response, control, last_tool)
-                # Also add to messages for ToolNode
-                # Manually accumulate tool_history
-                current_history = list(state.get("tool_history", []))
-                return {"tool_history": current_history + [response], "messages": [response]}
-
-            elif last_tool == "add_entry":
-                # Complete
-                # Complete - return with updated tool_history
-                return {"tool_history": tool_history + [AIMessage(content="Message processed.")]}
-
-        # FLUSH sequence: await_consistency → put_context (skip if context_only)
-        elif control == ControlState.FLUSH:
-            # Skip flush entirely in context_only mode
-            if self.context_only:
-                self.logger.info(json.dumps({
-                    "event": "flush_skipped",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "reason": "context_only_mode"
-                }))
-                return {"tool_history": tool_history + [AIMessage(content="Flush skipped (context-only).")]}
+        # If context_only mode, just add to conversation history without calling add_entry
+        if self.context_only:
+            if not to_process:
+                raise ValueError("No message to process in PROCESS_MESSAGE state")
 
-            # Check if put_context was already called in this flush
-            # This handles the case where LLM returns multiple tools including put_context
-            if self._check_put_context_called(tool_history):
-                return {"tool_history": tool_history + [AIMessage(content="Flushed to context.")]}
+            self.logger.info(json.dumps({
+                "event": "context_only_accumulate",
+                "timestamp": datetime.utcnow().isoformat(),
+                "message_role": to_process[0].role if to_process else None,
+                "message_preview": to_process[0].content[:200] if to_process and to_process[0].content else None
+            }))
 
-            # Only relevant tools for this state
-            if last_tool not in [None, "await_consistency", "put_context"]:
-                # Ignore tools from other control states, treat as starting fresh
-                last_tool = None
+            # Just add to conversation history and return
+            # FIX: Append to existing conversation_history instead of replacing it
+            return {
+                "conversation_history": conversation_history + to_process,
+                "tool_history": (*tool_history, _MESSAGE_ACCUMULATED)
+            }
 
-            if last_tool is None:
-                # First tool: await_consistency
-                args = {"memory_id": self.memory_id}
+        # Normal mode: process with add_entry
+        # Only relevant tool for this state is add_entry
+        if last_tool not in [None, "add_entry"]:
+            # Ignore tools from other control states, treat as starting fresh
+            last_tool = None
+
+        if last_tool is None:
+            # Only tool: add_entry (needs LLM for summary)
+            if not to_process:
+                raise ValueError("No message to process in PROCESS_MESSAGE state")
+
+            llm_messages = self._add_entry_llm_messages(conversation_history, to_process[0])
+            response = self._invoke_llm_with_retry(llm_messages)
+            # Filter tool calls to only allowed ones
+            response = self._filter_tool_calls(response, control, last_tool)
+            # Also add to messages for ToolNode
+            # Manually accumulate tool_history
+            current_history = state.get("tool_history", ())
+            return {"tool_history": (*current_history, response), "messages": [response]}
+
+        elif last_tool == "add_entry":
+            # Complete
+            # Complete - return with updated tool_history
+            return {"tool_history": (*tool_history, _MESSAGE_PROCESSED)}
+
+    def _observe_flush(self, state: AgentState, tool_history: List[BaseMessage],
+                       last_tool: Optional[str]) -> Optional[Dict[str, Any]]:
+        """FLUSH sequence: await_consistency → put_context (skip if context_only)."""
+        control = ControlState.FLUSH
+        conversation_history = state.get("conversation_history", [])
 
-                self.logger.info(json.dumps({
-                        "event": "creating_tool_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "tool": "await_consistency",
-                        "args": args
-                    }))
+        # Skip flush entirely in context_only mode
+        if self.context_only:
+            self.logger.info(json.dumps({
+                "event": "flush_skipped",
+                "timestamp": datetime.utcnow().isoformat(),
+                "reason": "context_only_mode"
+            }))
+            return {"tool_history": (*tool_history, _FLUSH_SKIPPED)}
+
+        # Check if put_context was already called in this flush
+        # This handles the case where LLM returns multiple tools including put_context
+        if self._check_put_context_called(tool_history):
+            return {"tool_history": (*tool_history, _FLUSHED)}
+
+        # Only relevant tools for this state
+        if last_tool not in [None, "await_consistency", "put_context"]:
+            # Ignore tools from other control states, treat as starting fresh
+            last_tool = None
 
-                # Create AIMessage with tool_calls for ToolNode to process
-                tool_call = {
-                    "id": "await_consistency_call_1",
-                    "name": "await_consistency",
+        if last_tool is None:
+            # First tool: await_consistency
+            args = {"memory_id": self.memory_id}
+
+            self.logger.info(json.dumps({
+                    "event": "creating_tool_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "tool": "await_consistency",
                     "args": args
-                }
+                }))
 
-                ai_msg = AIMessage(
-                    content="Ensuring all entries are persisted before updating context.",
-                    tool_calls=[tool_call]
-                )
+            # Create AIMessage with tool_calls for ToolNode to process
+            tool_call = {
+                "id": "await_consistency_call_1",
+                "name": "await_consistency",
+                "args": args
+            }
 
-                # Return with updated tool_history
-                return {"tool_history": tool_history + [ai_msg], "messages": [ai_msg]}
+            ai_msg = AIMessage(
+                content="Ensuring all entries are persisted before updating context.",
+                tool_calls=[tool_call]
+            )
 
-            elif last_tool == "await_consistency":
-                # Second tool: put_context (needs LLM for synthesis)
-                self.logger.info(json.dumps({
-                        "event": "llm_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context",
-                        "conversation_count": len(conversation_history)
-                    }))
+            # Return with updated tool_history
+            return {"tool_history": (*tool_history, ai_msg), "messages": [ai_msg]}
 
-                prompt = build_put_context_prompt(
-                    conversation_history, self.prompts,
-                    self.vault_id, self.memory_id, self.logger
-                )
-                llm_messages = [
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": "Execute the required operation."}
-                ]
-                # Log the full message array being sent to the model (put_context during FLUSH)
-                try:
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages),
-                        "messages": llm_messages
-                    }))
-                except (TypeError, ValueError):
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages)
-                    }))
-                response = self._invoke_llm_with_retry(llm_messages)
-                # Filter tool calls to only allowed ones
-                response = self._filter_tool_calls(response, control, last_tool)
-                # Also add to messages for ToolNode
-                # Manually accumulate tool_history
-                current_history = list(state.get("tool_history", []))
-                return {"tool_history": current_history + [response], "messages": [response]}
-
-            # This case is now handled at the beginning of FLUSH section
-            # elif last_tool == "put_context":
-            #     return {"tool_history": tool_history + [AIMessage(content="Flushed to context.")]}
-
-        # END_SESSION sequence: await_consistency → put_context
-        elif control == ControlState.END_SESSION:
-            # Check if put_context was already called in this end session
-            # This handles the case where LLM returns multiple tools including put_context
-            if self._check_put_context_called(tool_history):
-                return {"tool_history": tool_history + [AIMessage(content="Session ended.")]}
-
-            # Only relevant tools for this state
-            if last_tool not in [None, "await_consistency", "put_context"]:
-                # Ignore tools from other control states, treat as starting fresh
-                last_tool = None
-
-            if last_tool is None:
-                # First tool: await_consistency
-                args = {"memory_id": self.memory_id}
+        elif last_tool == "await_consistency":
+            # Second tool: put_context (needs LLM for synthesis)
+            self.logger.info(json.dumps({
+                    "event": "llm_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "purpose": "put_context",
+                    "conversation_count": len(conversation_history)
+                }))
 
-                self.logger.info(json.dumps({
-                        "event": "creating_tool_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "tool": "await_consistency",
-                        "args": args
-                    }))
+            prompt = build_put_context_prompt(
+                conversation_history, self.prompts,
+                self.vault_id, self.memory_id, self.logger
+            )
+            llm_messages = [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": "Execute the required operation."}
+            ]
+            # Log the full message array being sent to the model (put_context during FLUSH)
+            self._log_llm_input("put_context", llm_messages)
+            response = self._invoke_llm_with_retry(llm_messages)
+            # Filter tool calls to only allowed ones
+            response = self._filter_tool_calls(response, control, last_tool)
+            # Also add to messages for ToolNode
+            # Manually accumulate tool_history
+            current_history = state.get("tool_history", ())
+            return {"tool_history": (*current_history, response), "messages": [response]}
+
+        # This case is now handled at the beginning of FLUSH section
+        # elif last_tool == "put_context":
+        #     return {"tool_history": tool_history + [AIMessage(content="Flushed to context.")]}
+
+    def _observe_end_session(self, state: AgentState, tool_history: List[BaseMessage],
+                             last_tool: Optional[str]) -> Optional[Dict[str, Any]]:
+        """END_SESSION sequence: await_consistency → put_context."""
+        control = ControlState.END_SESSION
+        conversation_history = state.get("conversation_history", [])
+
+        # Check if put_context was already called in this end session
+        # This handles the case where LLM returns multiple tools including put_context
+        if self._check_put_context_called(tool_history):
+            return {"tool_history": (*tool_history, _SESSION_ENDED)}
+
+        # Only relevant tools for this state
+        if last_tool not in [None, "await_consistency", "put_context"]:
+            # Ignore tools from other control states, treat as starting fresh
+            last_tool = None
+
+        if last_tool is None:
+            # First tool: await_consistency
+            args = {"memory_id": self.memory_id}
 
-                # Create AIMessage with tool_calls for ToolNode to process
-                tool_call = {
-                    "id": "await_consistency_call_2",
-                    "name": "await_consistency",
+            self.logger.info(json.dumps({
+                    "event": "creating_tool_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "tool": "await_consistency",
                     "args": args
-                }
+                }))
 
-                ai_msg = AIMessage(
-                    content="Ensuring all entries are persisted before ending session.",
-                    tool_calls=[tool_call]
-                )
+            # Create AIMessage with tool_calls for ToolNode to process
+            tool_call = {
+                "id": "await_consistency_call_2",
+                "name": "await_consistency",
+                "args": args
+            }
 
-                # Return with updated tool_history (includes copied ToolMessages)
-                return {"tool_history": tool_history + [ai_msg], "messages": [ai_msg]}
+            ai_msg = AIMessage(
+                content="Ensuring all entries are persisted before ending session.",
+                tool_calls=[tool_call]
+            )
 
-            elif last_tool == "await_consistency":
-                # Second tool: put_context (needs LLM for synthesis)
-                self.logger.info(json.dumps({
-                        "event": "llm_call",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context_final",
-                        "conversation_count": len(conversation_history)
-                    }))
+            # Return with updated tool_history (includes copied ToolMessages)
+            return {"tool_history": (*tool_history, ai_msg), "messages": [ai_msg]}
 
-                prompt = build_put_context_prompt(
-                    conversation_history, self.prompts,
-                    self.vault_id, self.memory_id, self.logger
-                )
-                llm_messages = [
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": "Execute the required operation."}
-                ]
-                # Log the full message array being sent to the model (final put_context)
-                try:
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context_final",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages),
-                        "messages": llm_messages
-                    }))
-                except (TypeError, ValueError):
-                    self.logger.info(json.dumps({
-                        "event": "llm_input_messages_full",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "purpose": "put_context_final",
-                        "memory_id": self.memory_id,
-                        "vault_id": self.vault_id,
-                        "messages_count": len(llm_messages)
-                    }))
-                response = self._invoke_llm_with_retry(llm_messages)
-                # Filter tool calls to only allowed ones
-                response = self._filter_tool_calls(response, control, last_tool)
-                # Also add to messages for ToolNode
-                # Manually accumulate tool_history
-                current_history = list(state.get("tool_history", []))
-                return {"tool_history": current_history + [response], "messages": [response]}
-
-            # This case is now handled at the beginning of END_SESSION section
-            # elif last_tool == "put_context":
-            #     return {"tool_history": tool_history + [AIMessage(content="Session ended.")]}
+        elif last_tool == "await_consistency":
+            # Second tool: put_context (needs LLM for synthesis)
+            self.logger.info(json.dumps({
+                    "event": "llm_call",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "purpose": "put_context_final",
+                    "conversation_count": len(conversation_history)
+                }))
 
-        # Should not reach here
-        raise ValueError(f"Unexpected state: control={control}, last_tool={last_tool}")
+            prompt = build_put_context_prompt(
+                conversation_history, self.prompts,
+                self.vault_id, self.memory_id, self.logger
+            )
+            llm_messages = [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": "Execute the required operation."}
+            ]
+            # Log the full message array being sent to the model (final put_context)
+            self._log_llm_input("put_context_final", llm_messages)
+            response = self._invoke_llm_with_retry(llm_messages)
+            # Filter tool calls to only allowed ones
+            response = self._filter_tool_calls(response, control, last_tool)
+            # Also add to messages for ToolNode
+            # Manually accumulate tool_history
+            current_history = state.get("tool_history", ())
+            return {"tool_history": (*current_history, response), "messages": [response]}
+
+        # This case is now handled at the beginning of END_SESSION section
+        # elif last_tool == "put_context":
+        #     return {"tool_history": tool_history + [AIMessage(content="Session ended.")]}
+
+    # Control state -> handler; each returns the state update, or None if no step applies
+    _DISPATCH = {
+        ControlState.START_SESSION: _observe_start_session,
+        ControlState.PROCESS_MESSAGE: _observe_process_message,
+        ControlState.FLUSH: _observe_flush,
+        ControlState.END_SESSION: _observe_end_session,
+    }
 
     def should_execute_tools(self, state: AgentState) -> str:
         """Determine whether to execute tools or end.
@@ -788,19 +819,108 @@ class MycelianMemoryAgent:
 AGENT_PREFIX = """You are Mycelian's Memory Agent. Your job is to observe a conversation between a user and an AI Assistant and accurately store, retrieve and manage memories."""
 
 
+# Static prompt scaffolding, built once at import; per-call values are filled with format_map
+_ADD_ENTRY_TEMPLATE = AGENT_PREFIX + """
+
+Current Operation: PROCESS_MESSAGE
+Vault ID: {vault_id}
+Memory ID: {memory_id}
+
+Previous conversation context (including retrieved context from previous sessions):
+{context}
+
+Current message to process:
+Role: {role}
+Content: {content}
+
+INSTRUCTION: Call the add_entry tool for this single message following the rules below.
+Use vault_id="{vault_id}" and memory_id="{memory_id}" when calling the tool.
+USE THE CONVERSATION CONTEXT to resolve all pronouns and references when creating the summary.
+
+---
+ENTRY CAPTURE RULES:
+{capture}
+
+---
+SUMMARY GENERATION RULES:
+{summary}"""
+
+_PUT_CONTEXT_TEMPLATE = """{structured}
+
+=== OPERATION DETAILS ===
+Current Operation: CONTEXT_SYNTHESIS
+Vault ID: {vault_id}
+Memory ID: {memory_id}
+
+=== CRITICAL INSTRUCTIONS ===
+You MUST call ONLY the put_context tool - no other tools.
+- Call put_context with vault_id="{vault_id}" and memory_id="{memory_id}"
+- Do NOT call add_entry, await_consistency, or any other tools
+- Return ONLY a single put_context tool call
+
+=== OUTPUT RULES ===
+STRICT OUTPUT RULES FOR put_context.content:
+- Return ONLY the context body. Do NOT include any headings, titles, or prefaces such as "Context synthesized...", "Summary:", or similar.
+- Do NOT include meta commentary or labels. Start directly with the synthesized context content.
+- Use clear paragraphs or bullet points as needed, but avoid a leading label line.
+- IMPORTANT: Always preserve ALL facts from the Facts section of PREVIOUS CONTEXT, even when topics differ"""
+
+
 def format_messages(messages: Sequence[ChatMessage]) -> str:
     """Format a sequence of ChatMessages for display in prompts."""
-    formatted = []
-    for msg in messages:
-        formatted.append(f"Role: {msg.role}\nContent: {msg.content}")
-    return "\n\n".join(formatted)
+    return "\n\n".join(f"Role: {msg.role}\nContent: {msg.content}" for msg in messages)
+
+
+class HistoryFormatter:
+    """Drop-in for format_messages over a growing conversation history.
+
+    Keeps the formatted text of each message it has seen, so a history that only
+    grew since the last call formats just the new messages. Messages are matched
+    by their id (assigned by add_messages), falling back to role and content.
+    """
+
+    def __init__(self):
+        self._keys: List[Any] = []
+        self._parts: List[str] = []
+
+    @staticmethod
+    def _key(msg: ChatMessage) -> Any:
+        return getattr(msg, "id", None) or (msg.role, msg.content)
+
+    def __call__(self, messages: Sequence[ChatMessage]) -> str:
+        keys, parts = self._keys, self._parts
+        # Length of the prefix shared with the previously formatted history
+        shared = 0
+        limit = min(len(keys), len(messages))
+        while shared < limit and keys[shared] == self._key(messages[shared]):
+            shared += 1
+        del keys[shared:], parts[shared:]
+
+        for msg in messages[shared:]:
+            keys.append(self._key(msg))
+            parts.append(f"Role: {msg.role}\nContent: {msg.content}")
+        return "\n\n".join(parts)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_summary_prompt_override() -> Optional[str]:
+    """Read the benchmarker's enhanced summary prompt once, if it is present."""
+    enhanced_prompt_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        "prompts", "chat", "summary_prompt.md"
+    )
+    if not os.path.exists(enhanced_prompt_path):
+        return None
+    with open(enhanced_prompt_path, 'r') as f:
+        return f.read()
 
 
 def build_add_entry_prompt(conversation_history: Sequence[ChatMessage],
                           to_process: ChatMessage,
                           prompts: Dict[str, str],
                           vault_id: str,
-                          memory_id: str) -> str:
+                          memory_id: str,
+                          format_history: Callable[[Sequence[ChatMessage]], str] = format_messages) -> str:
     """Build prompt for add_entry tool call.
 
     Args:
@@ -809,6 +929,7 @@ def build_add_entry_prompt(conversation_history: Sequence[ChatMessage],
         prompts: Dictionary containing MCP prompt templates
         vault_id: The vault ID to use
         memory_id: The memory ID to use
+        format_history: Formatter for the history (e.g. a per-session HistoryFormatter)
 
     Returns:
         Formatted prompt for LLM to generate add_entry tool call
@@ -819,7 +940,7 @@ def build_add_entry_prompt(conversation_history: Sequence[ChatMessage],
         context = "No previous context available."
     else:
         # Format previous conversation for context (all except current)
-        context = format_messages(conversation_history)
+        context = format_history(conversation_history)
 
     # Validate current message
     if not to_process:
@@ -829,45 +950,20 @@ def build_add_entry_prompt(conversation_history: Sequence[ChatMessage],
     entry_capture_prompt = prompts.get("entry_capture_prompt", "")
 
     # Load our enhanced summary prompt that uses conversation context
-    import os
-    enhanced_prompt_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-        "prompts", "chat", "summary_prompt.md"
-    )
-
-    if os.path.exists(enhanced_prompt_path):
-        with open(enhanced_prompt_path, 'r') as f:
-            summary_prompt = f.read()
-    else:
+    summary_prompt = _load_summary_prompt_override()
+    if summary_prompt is None:
         # Fallback to MCP prompt if enhanced version not found
         summary_prompt = prompts.get("summary_prompt", "")
 
-    prompt = f"""{AGENT_PREFIX}
-
-Current Operation: PROCESS_MESSAGE
-Vault ID: {vault_id}
-Memory ID: {memory_id}
-
-Previous conversation context (including retrieved context from previous sessions):
-{context}
-
-Current message to process:
-Role: {to_process.role}
-Content: {to_process.content}
-
-INSTRUCTION: Call the add_entry tool for this single message following the rules below.
-Use vault_id="{vault_id}" and memory_id="{memory_id}" when calling the tool.
-USE THE CONVERSATION CONTEXT to resolve all pronouns and references when creating the summary.
-
----
-ENTRY CAPTURE RULES:
-{entry_capture_prompt}
-
----
-SUMMARY GENERATION RULES:
-{summary_prompt}"""
-
-    return prompt
+    return _ADD_ENTRY_TEMPLATE.format_map({
+        "vault_id": vault_id,
+        "memory_id": memory_id,
+        "context": context,
+        "role": to_process.role,
+        "content": to_process.content,
+        "capture": entry_capture_prompt,
+        "summary": summary_prompt,
+    })
 
 
 def build_structured_conversation(messages: Sequence[ChatMessage],
@@ -991,24 +1087,8 @@ def build_put_context_prompt(conversation_history: Sequence[ChatMessage],
     }))
 
     # Build the final prompt with structured conversation
-    prompt = f"""{structured_prompt}
-
-=== OPERATION DETAILS ===
-Current Operation: CONTEXT_SYNTHESIS
-Vault ID: {vault_id}
-Memory ID: {memory_id}
-
-=== CRITICAL INSTRUCTIONS ===
-You MUST call ONLY the put_context tool - no other tools.
-- Call put_context with vault_id="{vault_id}" and memory_id="{memory_id}"
-- Do NOT call add_entry, await_consistency, or any other tools
-- Return ONLY a single put_context tool call
-
-=== OUTPUT RULES ===
-STRICT OUTPUT RULES FOR put_context.content:
-- Return ONLY the context body. Do NOT include any headings, titles, or prefaces such as "Context synthesized...", "Summary:", or similar.
-- Do NOT include meta commentary or labels. Start directly with the synthesized context content.
-- Use clear paragraphs or bullet points as needed, but avoid a leading label line.
-- IMPORTANT: Always preserve ALL facts from the Facts section of PREVIOUS CONTEXT, even when topics differ"""
-
-    return prompt
+    return _PUT_CONTEXT_TEMPLATE.format_map({
+        "structured": structured_prompt,
+        "vault_id": vault_id,
+        "memory_id": memory_id,
+    })
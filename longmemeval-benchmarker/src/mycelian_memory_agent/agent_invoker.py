@@ -2,7 +2,9 @@
 
 import json
 import logging
+import os
 from datetime import datetime
+from time import monotonic as _monotonic
 from typing import Optional
 from langchain_core.messages import ChatMessage
 
@@ -11,6 +13,36 @@ from .agent import MycelianMemoryAgent
 
 DEFAULT_INVOKER_LOGGER = "lme.agent.invoker"
 
+# Control states used on every message; bound once to skip enum attribute lookups
+_START = ControlState.START_SESSION
+_PROCESS = ControlState.PROCESS_MESSAGE
+_FLUSH = ControlState.FLUSH
+_END = ControlState.END_SESSION
+
+DEFAULT_FLUSH_EVERY = 6
+# Adaptive mode never grows the interval beyond this multiple of the base interval
+MAX_FLUSH_EVERY_FACTOR = 8
+
+
+def flush_every_from_env(env_key: str = "MYCELIAN_FLUSH_EVERY") -> int:
+    """Messages between flushes, from env or DEFAULT_FLUSH_EVERY."""
+    raw = os.environ.get(env_key, "").strip()
+    try:
+        val = int(raw)
+    except ValueError:
+        return DEFAULT_FLUSH_EVERY
+    return val if val > 0 else DEFAULT_FLUSH_EVERY
+
+
+def flush_target_from_env(env_key: str = "MYCELIAN_FLUSH_TARGET_SECONDS") -> Optional[float]:
+    """Flush latency target enabling adaptive intervals, or None when unset/invalid."""
+    raw = os.environ.get(env_key, "").strip()
+    try:
+        val = float(raw)
+    except ValueError:
+        return None
+    return val if val > 0 else None
+
 
 class MycelianAgentInvoker:
     """Encapsulates message building and control determination.
@@ -22,15 +54,29 @@ class MycelianAgentInvoker:
     - Provides simple methods: start_session, process_conversation_message, end_session
     """
 
-    def __init__(self, agent: MycelianMemoryAgent, logger: Optional[logging.Logger] = None):
+    def __init__(self, agent: MycelianMemoryAgent, logger: Optional[logging.Logger] = None,
+                 flush_every: Optional[int] = None, flush_target_seconds: Optional[float] = None):
         """Initialize the invoker with an agent.
 
         Args:
             agent: The MycelianMemoryAgent to wrap
+            flush_every: Messages between flushes, at least 1 (default: MYCELIAN_FLUSH_EVERY or 6)
+            flush_target_seconds: Enables adaptive flushing. A flush slower than this
+                doubles the interval (up to MAX_FLUSH_EVERY_FACTOR x base); a faster
+                one halves it back toward the base interval.
+                Default: MYCELIAN_FLUSH_TARGET_SECONDS, unset means a fixed interval.
         """
         self.agent = agent
         self.logger = logger or logging.getLogger(f"{DEFAULT_INVOKER_LOGGER}.{getattr(agent, 'memory_id', 'unknown')}")
         self.msg_count = 0
+        if flush_every is None:
+            flush_every = flush_every_from_env()
+        elif flush_every < 1:
+            raise ValueError(f"flush_every must be at least 1, got {flush_every}")
+        self.base_flush_every = flush_every
+        self.flush_every = self.base_flush_every
+        self.flush_target_seconds = flush_target_seconds if flush_target_seconds is not None else flush_target_from_env()
+
     def start_session(self, thread_id: str) -> None:
         """Start a new session.
 
@@ -49,7 +95,7 @@ class MycelianAgentInvoker:
             }))
 
         result = self.agent.invoke(
-            control=ControlState.START_SESSION,
+            control=_START,
             thread_id=thread_id
         )
         return result
@@ -73,33 +119,59 @@ class MycelianAgentInvoker:
                 "timestamp": datetime.utcnow().isoformat(),
                 "thread_id": thread_id,
                 "msg_count": self.msg_count,
-                "control": ControlState.PROCESS_MESSAGE.value,
+                "control": _PROCESS.value,
                 "role": role,
                 "content_preview": content[:200] if content else None
             }))
 
         result = self.agent.invoke(
-            control=ControlState.PROCESS_MESSAGE,
+            control=_PROCESS,
             thread_id=thread_id,
             to_process=message
         )
 
-        # Then flush if needed (every 6 messages)
-        if self.msg_count % 6 == 0:
+        # Then flush if needed (every flush_every messages)
+        if self.msg_count % self.flush_every == 0:
             self.logger.info(json.dumps({
                     "event": "invoker_flush",
                     "timestamp": datetime.utcnow().isoformat(),
                     "thread_id": thread_id,
-                    "msg_count": self.msg_count
+                    "msg_count": self.msg_count,
+                    "flush_every": self.flush_every
                 }))
 
+            started = _monotonic()
             result = self.agent.invoke(
-                control=ControlState.FLUSH,
+                control=_FLUSH,
                 thread_id=thread_id
             )
+            if self.flush_target_seconds is not None:
+                self._adapt_flush_interval(_monotonic() - started, thread_id)
 
         return result
 
+    def _adapt_flush_interval(self, flush_seconds: float, thread_id: str) -> None:
+        """Double the flush interval after a slow flush, halve it after a fast one.
+
+        Intervals stay at base * 2^k, so flushes keep landing on multiples of the
+        base interval.
+        """
+        if flush_seconds > self.flush_target_seconds:
+            new_every = min(self.flush_every * 2, self.base_flush_every * MAX_FLUSH_EVERY_FACTOR)
+        else:
+            new_every = max(self.flush_every // 2, self.base_flush_every)
+
+        if new_every != self.flush_every:
+            self.logger.info(json.dumps({
+                    "event": "invoker_flush_interval",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "thread_id": thread_id,
+                    "flush_seconds": round(flush_seconds, 3),
+                    "previous_flush_every": self.flush_every,
+                    "flush_every": new_every
+                }))
+            self.flush_every = new_every
+
     def end_session(self, thread_id: str) -> None:
         """End the session.
 
@@ -116,7 +188,7 @@ class MycelianAgentInvoker:
             }))
 
         result = self.agent.invoke(
-            control=ControlState.END_SESSION,
+            control=_END,
             thread_id=thread_id
         )
         return result
@@ -8,24 +8,37 @@ needs. If we encounter issues with rate limiting or need more sophisticated retr
 module based on our results.
 
 This module provides:
-- Custom exponential backoff with jitter
+- Custom exponential backoff with jitter (driven by tenacity)
 - Configurable retry schedules via environment variables
-- Detailed retry logging
+- Detailed retry logging (plain callback, or structured records via a logging.Logger)
 - Support for both OpenAI and Vertex AI error patterns
+- Optional exact-match response cache that skips the call entirely on a hit
 
 To reactivate if needed:
 1. Import invoke_with_backoff from this module
-2. Wrap model calls with invoke_with_backoff
+2. Wrap model calls with invoke_with_backoff (or ainvoke_with_backoff for ainvoke calls)
 3. Configure LME_LLM_BACKOFF_SCHEDULE environment variable for custom schedules
 """
 
 from __future__ import annotations
 
-from typing import Callable, List, Optional, Any
+from typing import Awaitable, Callable, Hashable, List, Optional, Any, Tuple, Union
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import asyncio as _asyncio
+import functools
+import hashlib
+import json
+import logging
 import os
+import re
+import threading
 import time as _time
 import random as _random
 
+from tenacity import AsyncRetrying, RetryCallState, Retrying, retry_if_exception, stop_after_attempt
+
 
 DEFAULT_BACKOFF_SCHEDULE: List[float] = [5.0, 30.0, 120.0, 300.0, 600.0]
 
@@ -56,16 +69,70 @@ RETRYABLE_LLM_PATTERNS = {
     # Note: insufficient_quota is typically not quickly recoverable; handle separately below
 }
 
+# One pass over the lowercased message instead of a substring scan per keyword:
+# provider inference errors, 429 / "rate ... limit", 500-504 and the patterns above
+_RETRYABLE_MESSAGE_RE = re.compile("|".join([
+    r"unable to infer model provider",
+    r"429",
+    r"rate[\s\S]*limit|limit[\s\S]*rate",
+    r"50[0-4]",
+    *(re.escape(p) for p in sorted(RETRYABLE_LLM_PATTERNS, key=len, reverse=True)),
+]))
 
-def backoff_schedule_from_env(env_key: str = "LME_LLM_BACKOFF_SCHEDULE") -> List[float]:
-    raw = os.environ.get(env_key, "").strip()
+# Retryable Google/Vertex AI (case-sensitive) and OpenAI (case-insensitive) exception type names
+_RETRYABLE_GOOGLE_TYPE_RE = re.compile(
+    r"ResourceExhausted|ServiceUnavailable|DeadlineExceeded|Internal|Aborted|Unavailable")
+_RETRYABLE_OPENAI_TYPE_RE = re.compile(r"ratelimiterror|timeout|connectionerror", re.IGNORECASE)
+
+# HTTP status codes worth retrying: rate limiting and any server error
+_RETRYABLE_STATUS = frozenset([429, *range(500, 600)])
+
+
+def _load_retryable_exception_types() -> tuple:
+    """Collect concrete retryable exception classes from whichever SDKs are installed."""
+    types: List[type] = []
+    try:
+        from openai import RateLimitError, APIConnectionError, InternalServerError
+        # APITimeoutError subclasses APIConnectionError
+        types.extend([RateLimitError, APIConnectionError, InternalServerError])
+    except ImportError:
+        pass
+    try:
+        from google.api_core.exceptions import (
+            ResourceExhausted,
+            ServiceUnavailable,
+            DeadlineExceeded,
+            InternalServerError as GoogleInternalServerError,
+            Aborted,
+        )
+        types.extend([ResourceExhausted, ServiceUnavailable, DeadlineExceeded,
+                      GoogleInternalServerError, Aborted])
+    except ImportError:
+        pass
+    return tuple(types)
+
+
+# Known retryable SDK exception classes; checked before any string matching
+_RETRYABLE_EXC_TYPES = _load_retryable_exception_types()
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_backoff_schedule(raw: str) -> Tuple[float, ...]:
+    """Parse a CSV backoff schedule, falling back to the default; memoized per raw value."""
+    raw = raw.strip()
     if not raw:
-        return list(DEFAULT_BACKOFF_SCHEDULE)
+        return tuple(DEFAULT_BACKOFF_SCHEDULE)
     try:
-        vals = [float(s.strip()) for s in raw.split(",") if s.strip()]
-        return vals if vals else list(DEFAULT_BACKOFF_SCHEDULE)
+        vals = tuple(float(s.strip()) for s in raw.split(",") if s.strip())
+        return vals if vals else tuple(DEFAULT_BACKOFF_SCHEDULE)
     except Exception:
-        return list(DEFAULT_BACKOFF_SCHEDULE)
+        return tuple(DEFAULT_BACKOFF_SCHEDULE)
+
+
+def backoff_schedule_from_env(env_key: str = "LME_LLM_BACKOFF_SCHEDULE") -> List[float]:
+    # Only the env lookup happens per call; parsing is cached on the raw string,
+    # so a changed value is still picked up
+    return list(_parse_backoff_schedule(os.environ.get(env_key, "")))
 
 
 def is_retryable_llm_error(exc: Exception) -> bool:
@@ -78,94 +145,230 @@ def is_retryable_llm_error(exc: Exception) -> bool:
     - Common error patterns (rate_limit, timeout, etc.)
     - LangChain model provider inference errors (likely transient)
     """
+    # Fast path: concrete SDK exception classes
+    if isinstance(exc, _RETRYABLE_EXC_TYPES):
+        return True
+
     exc_type = type(exc).__name__
     exc_str = str(exc).lower()
 
-    # Check for LangChain model provider inference error (likely transient/throttling)
-    if "unable to infer model provider" in exc_str:
+    # Google/Vertex AI (ResourceExhausted, ServiceUnavailable, ...) and OpenAI
+    # (RateLimitError, Timeout, ConnectionError) exception types
+    if _RETRYABLE_GOOGLE_TYPE_RE.search(exc_type) or _RETRYABLE_OPENAI_TYPE_RE.search(exc_type):
         return True
 
-    # Check for Google/Vertex AI exception types
-    google_retryable_types = [
-        "ResourceExhausted",  # 429 equivalent
-        "ServiceUnavailable",  # 503 equivalent
-        "DeadlineExceeded",  # timeout
-        "Internal",  # 500 equivalent
-        "Aborted",  # transient error
-        "Unavailable"  # service unavailable
-    ]
-    if any(err_type in exc_type for err_type in google_retryable_types):
+    # LangChain provider inference errors (likely transient/throttling), HTTP status
+    # codes and common error patterns in the message (excluding insufficient_quota)
+    if _RETRYABLE_MESSAGE_RE.search(exc_str):
         return True
+    # Treat insufficient_quota as non-retryable (or handle with one-off long delay in caller)
+    if "insufficient_quota" in exc_str:
+        return False
 
-    # Check for OpenAI-specific exception types
-    if "ratelimiterror" in exc_type.lower():
-        return True
-    if "timeout" in exc_type.lower():
-        return True
-    if "connectionerror" in exc_type.lower():
-        return True
-    if "apierror" in exc_type.lower() and any(p in exc_str for p in ["500", "502", "503", "504"]):
+    # Check for retryable status codes on the exception (openai.APIStatusError)
+    # or on its response (some OpenAI errors only carry it there)
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status in _RETRYABLE_STATUS:
         return True
 
-    # Check for HTTP status codes in the error message
-    if "429" in exc_str or "rate" in exc_str and "limit" in exc_str:
-        return True
-    if any(f"50{i}" in exc_str for i in range(5)):  # 500-504
-        return True
+    return False
 
-    # Check for common error patterns (excluding insufficient_quota here)
-    for pattern in RETRYABLE_LLM_PATTERNS:
-        if pattern in exc_str:
-            return True
-    # Treat insufficient_quota as non-retryable (or handle with one-off long delay in caller)
-    if "insufficient_quota" in exc_str:
-        return False
 
-    # Check for openai.APIStatusError with retryable status codes
-    if hasattr(exc, 'status_code'):
-        status = getattr(exc, 'status_code', 0)
-        if status == 429 or (500 <= status < 600):
-            return True
+def retry_after_from_error(exc: Exception) -> Optional[float]:
+    """Return the server-advertised retry delay in seconds, if any.
 
-    # Check for response attribute (some OpenAI errors have this)
-    if hasattr(exc, 'response'):
+    Looks at ``exc.retry_after`` and the ``Retry-After`` header on ``exc.response``.
+    The header may be delta-seconds or an HTTP-date. Returns None when no usable
+    hint is present.
+    """
+    raw = getattr(exc, "retry_after", None)
+    if raw is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
         try:
-            response = getattr(exc, 'response')
-            if hasattr(response, 'status_code'):
-                status = response.status_code
-                if status == 429 or (500 <= status < 600):
-                    return True
+            raw = headers.get("Retry-After") or headers.get("retry-after")
         except Exception:
-            pass
+            return None
+    if raw is None:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(str(raw))
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
 
-    return False
+
+def _retry_sleep_seconds(exc: Exception, base_wait: float, max_wait: float) -> float:
+    """Jittered wait before the next attempt, preferring the server's Retry-After hint.
+
+    The hint is capped at `max_wait` (the longest scheduled wait), so a bogus
+    header such as ``Retry-After: 86400`` cannot stall a run for a day.
+    """
+    retry_after = retry_after_from_error(exc)
+    if retry_after is not None:
+        # Honor the server hint; jitter only upward so we never retry early
+        return max(0.1, min(max_wait, retry_after * (1.0 + _random.random() * 0.15)))
+    # +/-15% jitter around the scheduled wait
+    return max(0.1, base_wait * (0.85 + _random.random() * 0.3))
 
 
-def invoke_with_backoff(call_fn: Callable[[], Any], debug: bool = False, log: Optional[Callable[[str], None]] = None) -> Any:
+RetryLog = Union[Callable[[str], None], logging.Logger, logging.LoggerAdapter]
+
+
+def _retry_policy(schedule: List[float], log: Optional[RetryLog]) -> dict:
+    """Build tenacity arguments that follow `schedule` and our error classification.
+
+    1 immediate attempt + len(schedule) retries; the wait before retry N is
+    schedule[N-1] (or the server's Retry-After hint, capped at max(schedule)) with jitter.
+
+    `log` may be a callable taking a formatted line, or a Logger: retries are
+    then emitted as an "llm_retry" record with the details in `extra`, leaving
+    any serialization to the logger's handlers.
+    """
+    max_attempts = len(schedule) + 1
+    max_wait = max(schedule)
+
+    def wait(retry_state: RetryCallState) -> float:
+        # tenacity computes the wait before checking stop, so the final failed
+        # attempt lands past the end of the schedule; that value is never slept.
+        attempt = retry_state.attempt_number
+        if attempt > len(schedule):
+            return 0.0
+        return _retry_sleep_seconds(retry_state.outcome.exception(), schedule[attempt - 1], max_wait)
+
+    def before_sleep(retry_state: RetryCallState) -> None:
+        # Log retries unconditionally when a logger is supplied
+        error_type = type(retry_state.outcome.exception()).__name__
+        log(f"[agent][llm] retryable error ({error_type}): retry {retry_state.attempt_number}/{max_attempts} "
+            f"after {retry_state.next_action.sleep:.2f}s")
+
+    def before_sleep_structured(retry_state: RetryCallState) -> None:
+        log.info("llm_retry", extra={
+            "error_type": type(retry_state.outcome.exception()).__name__,
+            "attempt": retry_state.attempt_number,
+            "max_attempts": max_attempts,
+            "sleep_seconds": retry_state.next_action.sleep,
+        })
+
+    if log is None:
+        hook = None
+    elif isinstance(log, (logging.Logger, logging.LoggerAdapter)):
+        hook = before_sleep_structured
+    else:
+        hook = before_sleep
+
+    return {
+        "retry": retry_if_exception(is_retryable_llm_error),
+        "stop": stop_after_attempt(max_attempts),
+        "wait": wait,
+        "before_sleep": hook,
+        "reraise": True,
+    }
+
+
+class ResponseCache:
+    """Thread-safe bounded LRU of successful call results keyed by request fingerprint.
+
+    Cached values are returned as-is; callers must not mutate them.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Process-wide cache used when a cache_key is given without an explicit cache
+DEFAULT_RESPONSE_CACHE = ResponseCache()
+
+_MISS = object()
+
+
+def response_cache_key(model_name: str, messages: Any, tools: Any = None) -> str:
+    """Stable fingerprint of an LLM request: model, messages and tool schemas."""
+    payload = json.dumps([model_name, messages, tools], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def invoke_with_backoff(call_fn: Callable[[], Any], debug: bool = False, log: Optional[RetryLog] = None,
+                        cache_key: Optional[Hashable] = None, cache: Optional[ResponseCache] = None,
+                        sleep: Optional[Callable[[float], Any]] = None) -> Any:
     """DEPRECATED: Invoke call_fn with LLM-aware backoff (OpenAI and Vertex AI).
 
     This function is currently unused. We're using LangChain's built-in retry via max_retries.
     Keeping this for potential future use if we need more sophisticated retry logic.
 
     Schedule: from LME_LLM_BACKOFF_SCHEDULE (CSV, seconds) or DEFAULT_BACKOFF_SCHEDULE.
+    A server-provided Retry-After hint replaces the scheduled wait for that attempt.
     Retries only for transient LLM errors (rate limits, server errors, timeouts).
+
+    When cache_key is given (see response_cache_key), a cached result is returned
+    without calling call_fn; otherwise the successful result is cached.
+
+    `sleep` replaces time.sleep for the backoff waits (e.g. a recording fake in tests).
     """
-    schedule = backoff_schedule_from_env()
-    # attempts = 1 immediate + len(schedule) retries with sleeps
-    for attempt in range(1, len(schedule) + 2):
-        try:
-            return call_fn()
-        except Exception as e:
-            if not is_retryable_llm_error(e) or attempt > len(schedule):
-                raise
+    if cache_key is not None:
+        cache = cache if cache is not None else DEFAULT_RESPONSE_CACHE
+        cached = cache.get(cache_key, _MISS)
+        if cached is not _MISS:
+            return cached
+
+    # Looked up per call rather than bound as a default, so patching time.sleep still applies
+    retrying = Retrying(sleep=sleep if sleep is not None else _time.sleep,
+                        **_retry_policy(backoff_schedule_from_env(), log))
+    result = retrying(call_fn)
 
-            base_wait = schedule[attempt - 1]
-            jitter = 1.0 + _random.uniform(-0.15, 0.15)
-            sleep_for = max(0.1, base_wait * jitter)
+    if cache_key is not None:
+        cache.put(cache_key, result)
+    return result
+
+
+async def ainvoke_with_backoff(call_fn: Callable[[], Awaitable[Any]], debug: bool = False, log: Optional[RetryLog] = None,
+                               cache_key: Optional[Hashable] = None, cache: Optional[ResponseCache] = None,
+                               sleep: Optional[Callable[[float], Awaitable[Any]]] = None) -> Any:
+    """Async counterpart of invoke_with_backoff for coroutine-returning calls (e.g. ainvoke).
+
+    Same schedule, error classification, logging and caching; waits with asyncio.sleep
+    (or the given `sleep` coroutine function) so other tasks on the event loop keep
+    running while this call backs off.
+    """
+    if cache_key is not None:
+        cache = cache if cache is not None else DEFAULT_RESPONSE_CACHE
+        cached = cache.get(cache_key, _MISS)
+        if cached is not _MISS:
+            return cached
 
-            # Log retries unconditionally when a logger is supplied
-            if log is not None:
-                error_type = type(e).__name__
-                log(f"[agent][llm] retryable error ({error_type}): retry {attempt}/{len(schedule)+1} after {sleep_for:.2f}s")
+    # Looked up per call rather than bound as a default, so patching asyncio.sleep still applies
+    retrying = AsyncRetrying(sleep=sleep if sleep is not None else _asyncio.sleep,
+                             **_retry_policy(backoff_schedule_from_env(), log))
+    result = await retrying(call_fn)
 
-            _time.sleep(sleep_for)
+    if cache_key is not None:
+        cache.put(cache_key, result)
+    return result
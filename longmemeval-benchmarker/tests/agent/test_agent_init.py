@@ -2,11 +2,6 @@
 
 import unittest
 from unittest.mock import Mock, MagicMock, patch
-import sys
-from pathlib import Path
-
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from langchain_core.messages import AIMessage, ToolMessage, ChatMessage
 
@@ -1,16 +1,15 @@
 """Test the MycelianAgentInvoker class."""
 
 import unittest
-from unittest.mock import Mock, MagicMock
-import sys
-from pathlib import Path
-
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from unittest.mock import Mock, MagicMock, patch
 
 from langchain_core.messages import ChatMessage
 
-from src.mycelian_memory_agent.agent_invoker import MycelianAgentInvoker
+from src.mycelian_memory_agent.agent_invoker import (
+    MycelianAgentInvoker,
+    flush_every_from_env,
+    flush_target_from_env,
+)
 from src.mycelian_memory_agent.control_state import ControlState
 
 
@@ -50,8 +49,6 @@ class TestAgentInvoker(unittest.TestCase):
 
         # Process messages 1-5 (should use PROCESS_MESSAGE)
         for i in range(1, 6):
-            self.mock_agent.invoke.reset_mock()
-
             result = self.invoker.process_conversation_message(
                 role="user" if i % 2 else "assistant",
                 content=f"Message {i}",
@@ -61,8 +58,12 @@ class TestAgentInvoker(unittest.TestCase):
             # Check message count incremented
             self.assertEqual(self.invoker.msg_count, i)
 
+        # One invoke per message, none of them a flush
+        calls = self.mock_agent.invoke.call_args_list
+        self.assertEqual(len(calls), 5)
+
+        for i, call_args in enumerate(calls, start=1):
             # Should call with PROCESS_MESSAGE (not flush)
-            call_args = self.mock_agent.invoke.call_args
             self.assertEqual(call_args[1]["control"], ControlState.PROCESS_MESSAGE)
             self.assertEqual(call_args[1]["thread_id"], "thread_test")
 
@@ -97,32 +98,90 @@ class TestAgentInvoker(unittest.TestCase):
 
     def test_process_conversation_message_flush_pattern(self):
         """Test that flush happens every 6 messages (6, 12, 18, etc)."""
+        process, flush = ControlState.PROCESS_MESSAGE, ControlState.FLUSH
         test_cases = [
-            (5, ControlState.PROCESS_MESSAGE_AND_FLUSH),   # 5 -> 6 (flush!)
-            (6, ControlState.PROCESS_MESSAGE),             # 6 -> 7 (normal)
-            (7, ControlState.PROCESS_MESSAGE),             # 7 -> 8 (normal)
-            (11, ControlState.PROCESS_MESSAGE_AND_FLUSH),  # 11 -> 12 (flush!)
-            (12, ControlState.PROCESS_MESSAGE),            # 12 -> 13 (normal)
-            (17, ControlState.PROCESS_MESSAGE_AND_FLUSH),  # 17 -> 18 (flush!)
-            (18, ControlState.PROCESS_MESSAGE),            # 18 -> 19 (normal)
+            (5, [process, flush]),   # 5 -> 6 (flush!)
+            (6, [process]),          # 6 -> 7 (normal)
+            (7, [process]),          # 7 -> 8 (normal)
+            (11, [process, flush]),  # 11 -> 12 (flush!)
+            (12, [process]),         # 12 -> 13 (normal)
+            (17, [process, flush]),  # 17 -> 18 (flush!)
+            (18, [process]),         # 18 -> 19 (normal)
         ]
 
-        for initial_count, expected_control in test_cases:
-            self.mock_agent.invoke.reset_mock()
-            self.invoker.msg_count = initial_count
-
-            self.invoker.process_conversation_message(
-                role="user",
-                content=f"Test at {initial_count + 1}",
-                thread_id="thread_pattern"
-            )
-
-            call_args = self.mock_agent.invoke.call_args
-            self.assertEqual(
-                call_args[1]["control"],
-                expected_control,
-                f"Failed at count {initial_count + 1}: expected {expected_control}"
-            )
+        calls = self.mock_agent.invoke.call_args_list
+        for initial_count, expected_controls in test_cases:
+            with self.subTest(message=initial_count + 1):
+                self.invoker.msg_count = initial_count
+                before = len(calls)
+
+                self.invoker.process_conversation_message(
+                    role="user",
+                    content=f"Test at {initial_count + 1}",
+                    thread_id="thread_pattern"
+                )
+
+                controls_seen = [c[1]["control"] for c in calls[before:]]
+                self.assertEqual(controls_seen, expected_controls)
+
+    def test_flush_interval_configurable(self):
+        """Test that flush_every controls which messages trigger a flush."""
+        for flush_every in (1, 3, 6, 10):
+            with self.subTest(flush_every=flush_every):
+                agent = Mock()
+                invoker = MycelianAgentInvoker(agent, flush_every=flush_every)
+
+                for i in range(1, 2 * flush_every + 1):
+                    invoker.process_conversation_message(role="user", content=f"Msg {i}", thread_id="t")
+
+                flush_calls = [c for c in agent.invoke.call_args_list
+                               if c[1]["control"] == ControlState.FLUSH]
+                self.assertEqual(len(flush_calls), 2)
+
+    @patch.dict('os.environ', {'MYCELIAN_FLUSH_EVERY': '4'})
+    def test_flush_interval_from_env(self):
+        """Test that MYCELIAN_FLUSH_EVERY sets the default interval."""
+        self.assertEqual(MycelianAgentInvoker(Mock()).flush_every, 4)
+
+    def test_flush_interval_rejects_non_positive(self):
+        """Test that an explicit flush_every below 1 is rejected."""
+        for flush_every in (0, -2):
+            with self.subTest(flush_every=flush_every):
+                with self.assertRaises(ValueError):
+                    MycelianAgentInvoker(Mock(), flush_every=flush_every)
+
+    def test_flush_env_parsing_edge_cases(self):
+        """Test fallbacks for invalid flush env values."""
+        for raw in ("", "abc", "0", "-3"):
+            with self.subTest(raw=raw), patch.dict('os.environ', {'MYCELIAN_FLUSH_EVERY': raw}):
+                self.assertEqual(flush_every_from_env(), 6)
+
+        with patch.dict('os.environ', {'MYCELIAN_FLUSH_TARGET_SECONDS': ''}):
+            self.assertIsNone(flush_target_from_env())
+        with patch.dict('os.environ', {'MYCELIAN_FLUSH_TARGET_SECONDS': '2.5'}):
+            self.assertEqual(flush_target_from_env(), 2.5)
+
+    def test_adaptive_flush_interval(self):
+        """Test that slow flushes widen the interval and fast ones narrow it."""
+        invoker = MycelianAgentInvoker(self.mock_agent, flush_every=2, flush_target_seconds=1.0)
+
+        # Each flush is timed by two clock reads: slow, slow, then fast
+        clock = iter([0.0, 5.0, 10.0, 15.0, 20.0, 20.1])
+        with patch('src.mycelian_memory_agent.agent_invoker._monotonic', side_effect=lambda: next(clock)):
+            for i in range(1, 9):
+                invoker.process_conversation_message(role="user", content=f"Msg {i}", thread_id="t")
+
+        flushed_at = []
+        count = 0
+        for c in self.mock_agent.invoke.call_args_list:
+            if c[1]["control"] == ControlState.PROCESS_MESSAGE:
+                count += 1
+            else:
+                flushed_at.append(count)
+
+        # 2 (slow -> 4), 4 (slow -> 8), 8 (fast -> 4)
+        self.assertEqual(flushed_at, [2, 4, 8])
+        self.assertEqual(invoker.flush_every, 4)
 
     def test_end_session(self):
         """Test end_session method."""
@@ -151,34 +210,32 @@ class TestAgentInvoker(unittest.TestCase):
         self.assertEqual(self.invoker.msg_count, 0)
 
         # Process 7 messages (6th should flush)
-        controls_seen = []
         for i in range(1, 8):
-            self.mock_agent.invoke.reset_mock()
             self.invoker.process_conversation_message(
                 role="user" if i % 2 else "assistant",
                 content=f"Msg {i}",
                 thread_id=thread_id
             )
-            call_args = self.mock_agent.invoke.call_args
-            controls_seen.append(call_args[1]["control"])
+
+        # End session
+        self.invoker.end_session(thread_id)
 
         # Verify the pattern
+        controls_seen = [c[1]["control"] for c in self.mock_agent.invoke.call_args_list]
         expected = [
+            ControlState.START_SESSION,
             ControlState.PROCESS_MESSAGE,      # 1
             ControlState.PROCESS_MESSAGE,      # 2
             ControlState.PROCESS_MESSAGE,      # 3
             ControlState.PROCESS_MESSAGE,      # 4
             ControlState.PROCESS_MESSAGE,      # 5
-            ControlState.PROCESS_MESSAGE_AND_FLUSH,  # 6 - flush!
+            ControlState.PROCESS_MESSAGE,      # 6
+            ControlState.FLUSH,                # 6 - flush!
             ControlState.PROCESS_MESSAGE,      # 7
+            ControlState.END_SESSION,
         ]
         self.assertEqual(controls_seen, expected)
 
-        # End session
-        self.invoker.end_session(thread_id)
-        call_args = self.mock_agent.invoke.call_args
-        self.assertEqual(call_args[1]["control"], ControlState.END_SESSION)
-
     def test_chat_message_creation(self):
         """Test that ChatMessage objects are created correctly."""
         test_cases = [
@@ -188,8 +245,11 @@ class TestAgentInvoker(unittest.TestCase):
             ("function", "Tool output"),
         ]
 
+        # Validation is not under test here, so skip it for the expected side
+        expected = [ChatMessage.model_construct(role=role, content=content)
+                    for role, content in test_cases]
+
         for role, content in test_cases:
-            self.mock_agent.invoke.reset_mock()
             self.invoker.msg_count = 0  # Reset to avoid flush
 
             self.invoker.process_conversation_message(
@@ -198,13 +258,14 @@ class TestAgentInvoker(unittest.TestCase):
                 thread_id="msg_test"
             )
 
-            call_args = self.mock_agent.invoke.call_args
+        calls = self.mock_agent.invoke.call_args_list
+        self.assertEqual(len(calls), len(expected))
+
+        for call_args, expected_message in zip(calls, expected):
             message = call_args[1]["to_process"]
 
             self.assertIsInstance(message, ChatMessage)
-            self.assertEqual(message.role, role)
-            self.assertEqual(message.content, content)
-
+            self.assertEqual(message, expected_message)
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,12 +1,7 @@
 """Test the invoke method."""
 
 import unittest
-from unittest.mock import Mock, patch
-import sys
-from pathlib import Path
-
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from unittest.mock import AsyncMock, Mock, patch
 
 from langchain_core.messages import ChatMessage
 
@@ -17,15 +12,15 @@ from src.mycelian_memory_agent.control_state import ControlState
 class TestInvokeMethod(unittest.TestCase):
     """Test the invoke method."""
 
-    def setUp(self):
-        """Set up test agent with mocked graph."""
-        self.mock_graph = Mock()
-        self.mock_graph.invoke = Mock(return_value={"result": "success"})
+    @classmethod
+    def setUpClass(cls):
+        """Build the agent once with a mocked graph; tests only inspect graph calls."""
+        cls.mock_graph = Mock()
 
         with patch('src.mycelian_memory_agent.agent.MemorySaver'), \
              patch('src.mycelian_memory_agent.agent.ToolNode'), \
-             patch.object(MycelianMemoryAgent, '_build_graph', return_value=self.mock_graph):
-            self.agent = MycelianMemoryAgent(
+             patch.object(MycelianMemoryAgent, '_build_graph', return_value=cls.mock_graph):
+            cls.agent = MycelianMemoryAgent(
                 llm=Mock(),
                 tools=[],
                 prompts={},
@@ -33,6 +28,10 @@ class TestInvokeMethod(unittest.TestCase):
                 memory_id="memory"
             )
 
+    def setUp(self):
+        """Give each test a fresh graph entry point so call records don't leak."""
+        self.mock_graph.ainvoke = AsyncMock(return_value={"result": "success"})
+
     def test_invoke_start_session(self):
         """Test invoke with START_SESSION control."""
         result = self.agent.invoke(
@@ -40,11 +39,11 @@ class TestInvokeMethod(unittest.TestCase):
             thread_id="thread_123"
         )
 
-        # Check graph.invoke was called
-        self.mock_graph.invoke.assert_called_once()
+        # Check graph.ainvoke was called
+        self.mock_graph.ainvoke.assert_called_once()
 
         # Verify the state passed
-        call_args = self.mock_graph.invoke.call_args
+        call_args = self.mock_graph.ainvoke.call_args
         initial_state = call_args[0][0]
         config = call_args[0][1]
 
@@ -70,11 +69,11 @@ class TestInvokeMethod(unittest.TestCase):
             to_process=test_message
         )
 
-        # Check graph.invoke was called
-        self.mock_graph.invoke.assert_called_once()
+        # Check graph.ainvoke was called
+        self.mock_graph.ainvoke.assert_called_once()
 
         # Verify the state passed
-        call_args = self.mock_graph.invoke.call_args
+        call_args = self.mock_graph.ainvoke.call_args
         initial_state = call_args[0][0]
         config = call_args[0][1]
 
@@ -99,7 +98,7 @@ class TestInvokeMethod(unittest.TestCase):
         )
 
         # Verify the state passed
-        call_args = self.mock_graph.invoke.call_args
+        call_args = self.mock_graph.ainvoke.call_args
         initial_state = call_args[0][0]
 
         self.assertEqual(initial_state["control"], ControlState.PROCESS_MESSAGE_AND_FLUSH)
@@ -114,7 +113,7 @@ class TestInvokeMethod(unittest.TestCase):
         )
 
         # Verify the state passed
-        call_args = self.mock_graph.invoke.call_args
+        call_args = self.mock_graph.ainvoke.call_args
         initial_state = call_args[0][0]
         config = call_args[0][1]
 
@@ -133,7 +132,7 @@ class TestInvokeMethod(unittest.TestCase):
         )
 
         # Verify empty lists for to_process and conversation_history
-        call_args = self.mock_graph.invoke.call_args
+        call_args = self.mock_graph.ainvoke.call_args
         initial_state = call_args[0][0]
 
         self.assertEqual(initial_state["to_process"], [])
@@ -150,11 +149,12 @@ class TestInvokeMethod(unittest.TestCase):
             )
 
         # Verify each call used the correct thread_id
-        self.assertEqual(self.mock_graph.invoke.call_count, 3)
+        self.assertEqual(self.mock_graph.ainvoke.call_count, 3)
 
-        for i, call in enumerate(self.mock_graph.invoke.call_args_list):
-            config = call[0][1]
-            self.assertEqual(config["configurable"]["thread_id"], thread_ids[i])
+        for thread_id, call in zip(thread_ids, self.mock_graph.ainvoke.call_args_list):
+            with self.subTest(thread_id=thread_id):
+                config = call[0][1]
+                self.assertEqual(config["configurable"]["thread_id"], thread_id)
 
 
 if __name__ == "__main__":
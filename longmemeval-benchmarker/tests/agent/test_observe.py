@@ -1,77 +1,84 @@
 """Test the observe method with mocks to verify control flow logic."""
 
+import json
 import unittest
+from types import SimpleNamespace
 from unittest.mock import Mock, MagicMock, patch
 from typing import Dict, Any
 
 from langchain_core.messages import AIMessage, ToolMessage, ChatMessage
 
-import sys
-from pathlib import Path
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-
 from src.mycelian_memory_agent.agent import MycelianMemoryAgent, AgentState
 from src.mycelian_memory_agent.control_state import ControlState
 
 
+def _make_agent(context_only: bool = True):
+    """Build an agent over fresh mocks; returns (agent, mocks keyed by tool name and "llm_with_tools").
+
+    Nothing is shared between tests, so they can run in any order or in parallel workers.
+    """
+    # Mock LLM
+    mock_llm = Mock()
+    mock_llm_with_tools = Mock()
+    mock_llm.bind_tools = Mock(return_value=mock_llm_with_tools)
+
+    # observe() only emits tool calls for ToolNode (patched out below), so the
+    # tools themselves are never invoked here and plain stubs are enough
+    tools = [
+        SimpleNamespace(name="get_context"),
+        SimpleNamespace(name="list_entries"),
+        SimpleNamespace(name="add_entry"),
+        SimpleNamespace(name="await_consistency"),
+        SimpleNamespace(name="put_context")
+    ]
+
+    # Mock prompts
+    prompts = {
+        "entry_capture_prompt": "Capture entry prompt",
+        "summary_prompt": "Summary prompt",
+        "context_prompt": "Context prompt"
+    }
+
+    # Create agent with mocks
+    with patch.object(MycelianMemoryAgent, '_build_graph', return_value=Mock()), \
+         patch('src.mycelian_memory_agent.agent.ToolNode', return_value=Mock()):
+        agent = MycelianMemoryAgent(
+            llm=mock_llm,
+            tools=tools,
+            prompts=prompts,
+            vault_id="test_vault",
+            memory_id="test_memory",
+            context_only=context_only
+        )
+
+    mocks = {tool.name: tool for tool in tools}
+    mocks["llm_with_tools"] = mock_llm_with_tools
+    return agent, mocks
+
+
+def _tool_call(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The single tool call observe() handed to ToolNode."""
+    (ai_msg,) = result["messages"]
+    (call,) = ai_msg.tool_calls
+    return call
+
+
 class TestObserveMethod(unittest.TestCase):
     """Test the observe method for each control state."""
 
-    def setUp(self):
-        """Set up mocks for testing."""
-        # Mock LLM
-        self.mock_llm = Mock()
-        self.mock_llm_with_tools = Mock()
-        self.mock_llm.bind_tools = Mock(return_value=self.mock_llm_with_tools)
-
-        # Mock tools
-        self.mock_get_context = Mock(name="get_context")
-        self.mock_get_context.name = "get_context"
-        self.mock_get_context.invoke = Mock(return_value="Previous context data")
-
-        self.mock_list_entries = Mock(name="list_entries")
-        self.mock_list_entries.name = "list_entries"
-        self.mock_list_entries.invoke = Mock(return_value="Entry 1\nEntry 2")
-
-        self.mock_add_entry = Mock(name="add_entry")
-        self.mock_add_entry.name = "add_entry"
-
-        self.mock_await_consistency = Mock(name="await_consistency")
-        self.mock_await_consistency.name = "await_consistency"
-        self.mock_await_consistency.invoke = Mock(return_value=None)
-
-        self.mock_put_context = Mock(name="put_context")
-        self.mock_put_context.name = "put_context"
-
-        self.tools = [
-            self.mock_get_context,
-            self.mock_list_entries,
-            self.mock_add_entry,
-            self.mock_await_consistency,
-            self.mock_put_context
-        ]
+    def test_dispatch_covers_every_control_state(self):
+        """Test every ControlState has an observe handler and unknown controls raise."""
+        agent, mocks = _make_agent()
+        self.assertEqual(set(MycelianMemoryAgent._DISPATCH), set(ControlState))
 
-        # Mock prompts
-        self.prompts = {
-            "entry_capture_prompt": "Capture entry prompt",
-            "summary_prompt": "Summary prompt",
-            "context_prompt": "Context prompt"
-        }
-
-        # Create agent with mocks
-        with patch.object(MycelianMemoryAgent, '_build_graph', return_value=Mock()), \
-             patch('src.mycelian_memory_agent.agent.ToolNode', return_value=Mock()):
-            self.agent = MycelianMemoryAgent(
-                llm=self.mock_llm,
-                tools=self.tools,
-                prompts=self.prompts,
-                vault_id="test_vault",
-                memory_id="test_memory"
-            )
+        with self.assertRaises(ValueError) as ctx:
+            agent.observe({"control": None, "tool_history": [],
+                                "conversation_history": [], "to_process": []})
+        self.assertIn("Unexpected state", str(ctx.exception))
 
     def test_start_session_first_call(self):
-        """Test START_SESSION control state - first call should invoke get_context."""
+        """Test START_SESSION control state - first call should request await_consistency."""
+        agent, mocks = _make_agent()
         state = {
             "control": ControlState.START_SESSION,
             "tool_history": [],
@@ -79,44 +86,54 @@ class TestObserveMethod(unittest.TestCase):
             "to_process": []
         }
 
-        result = self.agent.observe(state)
+        result = agent.observe(state)
 
-        # Should call get_context directly
-        self.mock_get_context.invoke.assert_called_once_with({
-            "vault_id": "test_vault",
-            "memory_id": "test_memory"
-        })
+        # Should hand ToolNode an await_consistency call
+        call = _tool_call(result)
+        self.assertEqual(call["name"], "await_consistency")
+        self.assertEqual(call["args"], {"memory_id": "test_memory"})
+        self.assertEqual(result["tool_history"][-1], result["messages"][0])
 
-        # Should return tool message in history
-        self.assertEqual(len(result["tool_history"]), 1)
-        self.assertIsInstance(result["tool_history"][0], ToolMessage)
-        self.assertEqual(result["tool_history"][0].name, "get_context")
-        self.assertEqual(result["tool_history"][0].content, "Previous context data")
+    def test_start_session_tool_sequence(self):
+        """Test START_SESSION follows await_consistency with get_context, then list_entries."""
+        agent, mocks = _make_agent()
+        state = {
+            "control": ControlState.START_SESSION,
+            "tool_history": [
+                ToolMessage(name="await_consistency", content="ok", tool_call_id="1")
+            ],
+            "conversation_history": [],
+            "to_process": []
+        }
+
+        call = _tool_call(agent.observe(state))
+        self.assertEqual(call["name"], "get_context")
+        self.assertEqual(call["args"], {"vault_id": "test_vault", "memory_id": "test_memory"})
+
+        state["tool_history"].append(
+            ToolMessage(name="get_context", content="Previous context data", tool_call_id="2")
+        )
+        call = _tool_call(agent.observe(state))
+        self.assertEqual(call["name"], "list_entries")
+        self.assertEqual(call["args"], {"vault_id": "test_vault", "memory_id": "test_memory", "limit": 10})
 
     def test_start_session_second_call(self):
-        """Test START_SESSION control state - second call should invoke list_entries."""
-        # Simulate we already called get_context
+        """Test START_SESSION after list_entries adds context and entries to the conversation."""
+        agent, mocks = _make_agent()
         state = {
             "control": ControlState.START_SESSION,
             "tool_history": [
-                ToolMessage(
-                    name="get_context",
-                    content="Previous context data",
-                    tool_call_id="get_context_call"
-                )
+                ToolMessage(name="get_context", content="Previous context data", tool_call_id="1"),
+                ToolMessage(name="list_entries", content="Entry 1\nEntry 2", tool_call_id="2")
             ],
             "conversation_history": [],
             "to_process": []
         }
 
-        result = self.agent.observe(state)
+        result = agent.observe(state)
 
-        # Should call list_entries directly
-        self.mock_list_entries.invoke.assert_called_once_with({
-            "vault_id": "test_vault",
-            "memory_id": "test_memory",
-            "limit": 10
-        })
+        # No further tool calls
+        self.assertNotIn("messages", result)
 
         # Should update conversation_history with context
         self.assertIn("conversation_history", result)
@@ -135,11 +152,35 @@ class TestObserveMethod(unittest.TestCase):
         self.assertIn("Entry 1", entries_msg.content)
 
         # Should mark complete
-        self.assertIsInstance(result["tool_history"][0], AIMessage)
-        self.assertEqual(result["tool_history"][0].content, "Session started.")
+        self.assertIsInstance(result["tool_history"][-1], AIMessage)
+        self.assertEqual(result["tool_history"][-1].content, "Session started.")
+
+    def test_tool_results_copied_once(self):
+        """Test ToolMessages already in tool_history are not copied again from messages."""
+        agent, mocks = _make_agent()
+        state = {
+            "control": ControlState.START_SESSION,
+            "tool_history": [
+                ToolMessage(name="await_consistency", content="ok", tool_call_id="1")
+            ],
+            "conversation_history": [],
+            "to_process": [],
+            # An equal but distinct result, as after a checkpoint round-trip, plus a new one
+            "messages": [
+                ToolMessage(name="await_consistency", content="ok", tool_call_id="1"),
+                ToolMessage(name="get_context", content="Stored context", tool_call_id="2")
+            ]
+        }
+
+        result = agent.observe(state)
+
+        tool_messages = [m for m in result["tool_history"] if isinstance(m, ToolMessage)]
+        self.assertEqual([m.name for m in tool_messages], ["await_consistency", "get_context"])
+        self.assertEqual(result["messages"][0].tool_calls[0]["name"], "list_entries")
 
     def test_process_message_no_message(self):
         """Test PROCESS_MESSAGE without a message should raise error."""
+        agent, mocks = _make_agent()
         state = {
             "control": ControlState.PROCESS_MESSAGE,
             "tool_history": [],
@@ -148,13 +189,32 @@ class TestObserveMethod(unittest.TestCase):
         }
 
         with self.assertRaises(ValueError) as ctx:
-            self.agent.observe(state)
+            agent.observe(state)
 
         self.assertIn("No message to process", str(ctx.exception))
 
+    def test_process_message_context_only_accumulates(self):
+        """Test PROCESS_MESSAGE in context_only mode appends the message without an LLM call."""
+        agent, mocks = _make_agent()
+        test_message = ChatMessage(role="user", content="Hello")
+        state = {
+            "control": ControlState.PROCESS_MESSAGE,
+            "tool_history": [],
+            "conversation_history": [ChatMessage(role="system", content="Context")],
+            "to_process": [test_message]
+        }
+
+        result = agent.observe(state)
+
+        mocks["llm_with_tools"].invoke.assert_not_called()
+        self.assertNotIn("messages", result)
+        self.assertEqual(result["conversation_history"][-1], test_message)
+        self.assertEqual(result["tool_history"][-1].content, "Message accumulated (context-only).")
+
     @patch('src.mycelian_memory_agent.agent.build_add_entry_prompt')
     def test_process_message_with_message(self, mock_build_prompt):
         """Test PROCESS_MESSAGE with a message should call LLM."""
+        agent, mocks = _make_agent(context_only=False)
         mock_build_prompt.return_value = "Test prompt for add_entry"
 
         # Mock LLM response
@@ -162,7 +222,7 @@ class TestObserveMethod(unittest.TestCase):
             content="",
             tool_calls=[{"name": "add_entry", "args": {"summary": "test"}, "id": "123"}]
         )
-        self.mock_llm_with_tools.invoke.return_value = mock_ai_response
+        mocks["llm_with_tools"].invoke.return_value = mock_ai_response
 
         test_message = ChatMessage(role="user", content="Hello")
         state = {
@@ -172,19 +232,39 @@ class TestObserveMethod(unittest.TestCase):
             "to_process": [test_message]
         }
 
-        result = self.agent.observe(state)
+        result = agent.observe(state)
 
         # Should build prompt
         mock_build_prompt.assert_called_once()
 
         # Should call LLM
-        self.mock_llm_with_tools.invoke.assert_called_once()
+        mocks["llm_with_tools"].invoke.assert_called_once()
 
         # Should return LLM response
-        self.assertEqual(result["tool_history"][0], mock_ai_response)
+        self.assertEqual(result["tool_history"][-1], mock_ai_response)
+        self.assertEqual(result["messages"], [mock_ai_response])
+
+    def test_llm_input_log(self):
+        """Test the full LLM input is logged as JSON, and not serialized when INFO is off."""
+        agent, mocks = _make_agent()
+        llm_messages = [{"role": "system", "content": "prompt"}]
+        with patch.object(agent, "logger") as mock_logger:
+            mock_logger.isEnabledFor.return_value = True
+            agent._log_llm_input("add_entry", llm_messages)
+            logged = json.loads(mock_logger.info.call_args[0][0])
+            self.assertEqual(logged["event"], "llm_input_messages_full")
+            self.assertEqual(logged["messages"], llm_messages)
+
+            mock_logger.reset_mock()
+            mock_logger.isEnabledFor.return_value = False
+            with patch("src.mycelian_memory_agent.agent.json.dumps") as mock_dumps:
+                agent._log_llm_input("add_entry", llm_messages)
+            mock_dumps.assert_not_called()
+            mock_logger.info.assert_not_called()
 
     def test_process_message_after_add_entry(self):
         """Test PROCESS_MESSAGE after add_entry completes."""
+        agent, mocks = _make_agent(context_only=False)
         state = {
             "control": ControlState.PROCESS_MESSAGE,
             "tool_history": [
@@ -195,72 +275,71 @@ class TestObserveMethod(unittest.TestCase):
             "to_process": []
         }
 
-        result = self.agent.observe(state)
+        result = agent.observe(state)
 
         # Should mark complete
-        self.assertIsInstance(result["tool_history"][0], AIMessage)
-        self.assertEqual(result["tool_history"][0].content, "Message processed.")
-
-    @patch('src.mycelian_memory_agent.agent.build_add_entry_prompt')
-    @patch('src.mycelian_memory_agent.agent.build_put_context_prompt')
-    def test_flush_sequence(self, mock_put_prompt, mock_add_prompt):
-        """Test PROCESS_MESSAGE_AND_FLUSH full sequence."""
-        mock_add_prompt.return_value = "Add entry prompt"
-        mock_put_prompt.return_value = "Put context prompt"
+        self.assertIsInstance(result["tool_history"][-1], AIMessage)
+        self.assertEqual(result["tool_history"][-1].content, "Message processed.")
 
-        # Test first call - should do add_entry
+    def test_flush_skipped_in_context_only_mode(self):
+        """Test FLUSH does nothing in context_only mode."""
+        agent, mocks = _make_agent()
         state = {
-            "control": ControlState.PROCESS_MESSAGE_AND_FLUSH,
+            "control": ControlState.FLUSH,
             "tool_history": [],
-            "conversation_history": [],
-            "to_process": [ChatMessage(role="user", content="Test")]
+            "conversation_history": [ChatMessage(role="user", content="Test")],
+            "to_process": []
         }
 
-        mock_ai_response = AIMessage(content="", tool_calls=[{"name": "add_entry", "args": {}, "id": "1"}])
-        self.mock_llm_with_tools.invoke.return_value = mock_ai_response
+        result = agent.observe(state)
 
-        result = self.agent.observe(state)
-        self.assertEqual(result["tool_history"][0], mock_ai_response)
+        self.assertNotIn("messages", result)
+        self.assertEqual(result["tool_history"][-1].content, "Flush skipped (context-only).")
 
-        # Test second call - after add_entry, should do await_consistency
-        state["tool_history"] = [
-            AIMessage(content="", tool_calls=[{"name": "add_entry", "args": {}, "id": "1"}]),
-            ToolMessage(name="add_entry", content="Added", tool_call_id="123")
-        ]
+    @patch('src.mycelian_memory_agent.agent.build_put_context_prompt')
+    def test_flush_sequence(self, mock_put_prompt):
+        """Test FLUSH sequence: await_consistency -> put_context -> done."""
+        agent, mocks = _make_agent(context_only=False)
+        mock_put_prompt.return_value = "Put context prompt"
 
-        result = self.agent.observe(state)
-        self.mock_await_consistency.invoke.assert_called_once()
+        # First call - should do await_consistency
+        state = {
+            "control": ControlState.FLUSH,
+            "tool_history": [],
+            "conversation_history": [ChatMessage(role="user", content="Test")],
+            "to_process": []
+        }
 
-        # Should return just the await_consistency message (not accumulate)
-        self.assertEqual(len(result["tool_history"]), 1)
-        self.assertIsInstance(result["tool_history"][0], ToolMessage)
-        self.assertEqual(result["tool_history"][0].name, "await_consistency")
+        call = _tool_call(agent.observe(state))
+        self.assertEqual(call["name"], "await_consistency")
+        self.assertEqual(call["args"], {"memory_id": "test_memory"})
 
-        # Test third call - after await_consistency, should do put_context
+        # Second call - after await_consistency, should do put_context
         state["tool_history"] = [
-            AIMessage(content="", tool_calls=[{"name": "add_entry", "args": {}, "id": "1"}]),
-            ToolMessage(name="add_entry", content="Added", tool_call_id="123"),
             ToolMessage(name="await_consistency", content="Done", tool_call_id="456")
         ]
 
-        mock_ai_response2 = AIMessage(content="", tool_calls=[{"name": "put_context", "args": {}, "id": "2"}])
-        self.mock_llm_with_tools.invoke.return_value = mock_ai_response2
+        mock_ai_response = AIMessage(content="", tool_calls=[{"name": "put_context", "args": {}, "id": "2"}])
+        mocks["llm_with_tools"].invoke.return_value = mock_ai_response
 
-        result = self.agent.observe(state)
+        result = agent.observe(state)
         mock_put_prompt.assert_called_once()
-        self.assertEqual(result["tool_history"][0], mock_ai_response2)
+        mocks["llm_with_tools"].invoke.assert_called_once()
+        self.assertEqual(result["tool_history"][-1], mock_ai_response)
 
-        # Test final call - after put_context, should complete
+        # Final call - after put_context, should complete
         state["tool_history"] = [
+            ToolMessage(name="await_consistency", content="Done", tool_call_id="456"),
             AIMessage(content="", tool_calls=[{"name": "put_context", "args": {}, "id": "2"}]),
-            ToolMessage(name="put_context", content="Saved", tool_call_id="789")
+            ToolMessage(name="put_context", content="Saved", tool_call_id="2")
         ]
 
-        result = self.agent.observe(state)
-        self.assertEqual(result["tool_history"][0].content, "Flushed to context.")
+        result = agent.observe(state)
+        self.assertEqual(result["tool_history"][-1].content, "Flushed to context.")
 
     def test_end_session_sequence(self):
         """Test END_SESSION sequence."""
+        agent, mocks = _make_agent()
         # First call - should do await_consistency
         state = {
             "control": ControlState.END_SESSION,
@@ -269,10 +348,8 @@ class TestObserveMethod(unittest.TestCase):
             "to_process": []
         }
 
-        result = self.agent.observe(state)
-        self.mock_await_consistency.invoke.assert_called_once()
-        self.assertIsInstance(result["tool_history"][0], ToolMessage)
-        self.assertEqual(result["tool_history"][0].name, "await_consistency")
+        call = _tool_call(agent.observe(state))
+        self.assertEqual(call["name"], "await_consistency")
 
         # Second call - after await_consistency, should do put_context
         state["tool_history"] = [
@@ -280,23 +357,24 @@ class TestObserveMethod(unittest.TestCase):
         ]
 
         mock_ai_response = AIMessage(content="", tool_calls=[{"name": "put_context", "args": {}, "id": "3"}])
-        self.mock_llm_with_tools.invoke.return_value = mock_ai_response
+        mocks["llm_with_tools"].invoke.return_value = mock_ai_response
 
         with patch('src.mycelian_memory_agent.agent.build_put_context_prompt') as mock_prompt:
             mock_prompt.return_value = "Put context prompt"
-            result = self.agent.observe(state)
+            result = agent.observe(state)
             mock_prompt.assert_called_once()
 
-        self.assertEqual(result["tool_history"][0], mock_ai_response)
+        self.assertEqual(result["tool_history"][-1], mock_ai_response)
 
         # Final call - after put_context, should complete
         state["tool_history"] = [
+            ToolMessage(name="await_consistency", content="Done", tool_call_id="123"),
             AIMessage(content="", tool_calls=[{"name": "put_context", "args": {}, "id": "3"}]),
             ToolMessage(name="put_context", content="Saved", tool_call_id="456")
         ]
 
-        result = self.agent.observe(state)
-        self.assertEqual(result["tool_history"][0].content, "Session ended.")
+        result = agent.observe(state)
+        self.assertEqual(result["tool_history"][-1].content, "Session ended.")
 
 
 if __name__ == "__main__":
@@ -7,14 +7,9 @@ in build_put_context_prompt.
 """
 
 import json
-import sys
 import unittest
-from pathlib import Path
 from unittest.mock import patch
 
-# Ensure src/ is importable
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-
 from langchain_core.messages import ChatMessage  # type: ignore
 
 from src.mycelian_memory_agent.build import build_agent_with_invoker
@@ -1,11 +1,6 @@
 """Test the prompt building functions."""
 
 import unittest
-import sys
-from pathlib import Path
-
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from langchain_core.messages import ChatMessage
 
@@ -13,6 +8,7 @@ from src.mycelian_memory_agent.agent import (
     format_messages,
     build_add_entry_prompt,
     build_put_context_prompt,
+    HistoryFormatter,
     AGENT_PREFIX
 )
 
@@ -44,6 +40,57 @@ class TestPromptFunctions(unittest.TestCase):
         result = format_messages(messages)
         self.assertEqual(result, "")
 
+    def test_history_formatter_matches_format_messages(self):
+        """Test HistoryFormatter output is identical to format_messages as history grows."""
+        formatter = HistoryFormatter()
+        history = []
+        for i in range(5):
+            history = history + [ChatMessage(role="user" if i % 2 else "assistant", content=f"Turn {i}")]
+            self.assertEqual(formatter(history), format_messages(history))
+
+        # A history that diverges from the cached prefix is reformatted
+        rewritten = [ChatMessage(role="system", content="Fresh start")] + history[1:]
+        self.assertEqual(formatter(rewritten), format_messages(rewritten))
+        self.assertEqual(formatter([]), "")
+
+    def test_history_formatter_only_formats_new_messages(self):
+        """Test that already-seen messages are not formatted again."""
+        formatter = HistoryFormatter()
+        history = [ChatMessage(role="user", content="One", id="1"),
+                   ChatMessage(role="assistant", content="Two", id="2")]
+        formatter(history)
+
+        history.append(ChatMessage(role="user", content="Three", id="3"))
+        formatter(history)
+
+        self.assertEqual(formatter._keys, ["1", "2", "3"])
+        self.assertEqual(len(formatter._parts), 3)
+
+    def test_build_add_entry_prompt_with_formatter(self):
+        """Test build_add_entry_prompt produces the same prompt through a HistoryFormatter."""
+        history = [
+            ChatMessage(role="system", content="Previous context"),
+            ChatMessage(role="user", content="Earlier question")
+        ]
+        current = ChatMessage(role="user", content="Current message")
+        prompts = {"entry_capture_prompt": "Capture rules here"}
+
+        expected = build_add_entry_prompt(history, current, prompts, "vault", "memory")
+        result = build_add_entry_prompt(history, current, prompts, "vault", "memory",
+                                        format_history=HistoryFormatter())
+        self.assertEqual(result, expected)
+
+    def test_build_add_entry_prompt_keeps_braces(self):
+        """Test braces in message content and prompts are passed through verbatim."""
+        current = ChatMessage(role="user", content='Store {"key": "value"} for {name}')
+        prompts = {"entry_capture_prompt": "Rules with {placeholder}"}
+
+        result = build_add_entry_prompt([], current, prompts, "vault", "memory")
+
+        self.assertIn('Content: Store {"key": "value"} for {name}', result)
+        self.assertIn("Rules with {placeholder}", result)
+        self.assertIn('vault_id="vault"', result)
+
     def test_build_add_entry_prompt_with_context(self):
         """Test build_add_entry_prompt with conversation history."""
         history = [
@@ -56,7 +103,7 @@ class TestPromptFunctions(unittest.TestCase):
             "summary_prompt": "Summary rules here"
         }
 
-        result = build_add_entry_prompt(history, current, prompts)
+        result = build_add_entry_prompt(history, current, prompts, "vault", "memory")
 
         # Check key components are present
         self.assertIn(AGENT_PREFIX, result)
@@ -75,7 +122,7 @@ class TestPromptFunctions(unittest.TestCase):
         current = ChatMessage(role="assistant", content="First response")
         prompts = {}
 
-        result = build_add_entry_prompt(history, current, prompts)
+        result = build_add_entry_prompt(history, current, prompts, "vault", "memory")
 
         # Check it handles empty history gracefully
         self.assertIn("No previous context available", result)
@@ -88,7 +135,7 @@ class TestPromptFunctions(unittest.TestCase):
         prompts = {}
 
         with self.assertRaises(ValueError) as ctx:
-            build_add_entry_prompt(history, None, prompts)
+            build_add_entry_prompt(history, None, prompts, "vault", "memory")
 
         self.assertIn("No message to process", str(ctx.exception))
 
@@ -98,7 +145,7 @@ class TestPromptFunctions(unittest.TestCase):
         current = ChatMessage(role="user", content="Test")
         prompts = {}  # Empty prompts dict
 
-        result = build_add_entry_prompt(history, current, prompts)
+        result = build_add_entry_prompt(history, current, prompts, "vault", "memory")
 
         # Should still work with empty prompt values
         self.assertIn("ENTRY CAPTURE RULES:", result)
@@ -158,7 +205,7 @@ class TestPromptFunctions(unittest.TestCase):
             "entry_capture_prompt": "Rule 1\nRule 2\nRule 3"
         }
 
-        result = build_add_entry_prompt(history, current, prompts)
+        result = build_add_entry_prompt(history, current, prompts, "vault", "memory")
 
         # Check multiline content is preserved
         self.assertIn("Line 1\nLine 2\nLine 3", result)
@@ -1,11 +1,6 @@
 """Test structured conversation format for context synthesis."""
 
 import unittest
-import sys
-from pathlib import Path
-
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from langchain_core.messages import ChatMessage
 
@@ -17,6 +12,11 @@ from src.mycelian_memory_agent.agent import (
 )
 
 
+def _msg(role: str, content: str) -> ChatMessage:
+    """Build a ChatMessage from trusted literals without running pydantic validation."""
+    return ChatMessage.model_construct(role=role, content=content)
+
+
 class TestStructuredPrompt(unittest.TestCase):
     """Test structured conversation format for proper context synthesis."""
 
@@ -24,10 +24,10 @@ class TestStructuredPrompt(unittest.TestCase):
         """Test building structured conversation sections from messages."""
         # Given messages with previous context and current session
         messages = [
-            ChatMessage(role="system", content="[previous_context]\nUser has a dog named Max"),
-            ChatMessage(role="system", content="Recent entries: []"),
-            ChatMessage(role="user", content="I have a cat named Luna"),
-            ChatMessage(role="assistant", content="Nice to meet Luna!")
+            _msg("system", "[previous_context]\nUser has a dog named Max"),
+            _msg("system", "Recent entries: []"),
+            _msg("user", "I have a cat named Luna"),
+            _msg("assistant", "Nice to meet Luna!")
         ]
 
         prompts = {
@@ -61,8 +61,8 @@ class TestStructuredPrompt(unittest.TestCase):
     def test_build_structured_conversation_no_previous_context(self):
         """Test when there's no previous context, only current session."""
         messages = [
-            ChatMessage(role="user", content="Hello world"),
-            ChatMessage(role="assistant", content="Hi there!")
+            _msg("user", "Hello world"),
+            _msg("assistant", "Hi there!")
         ]
 
         prompts = {"context_prompt": "Some rules"}
@@ -81,8 +81,8 @@ class TestStructuredPrompt(unittest.TestCase):
     def test_build_structured_conversation_only_previous(self):
         """Test when there's only previous context, no current session."""
         messages = [
-            ChatMessage(role="system", content="[previous_context]\nOld information"),
-            ChatMessage(role="system", content="Recent entries: empty")
+            _msg("system", "[previous_context]\nOld information"),
+            _msg("system", "Recent entries: empty")
         ]
 
         prompts = {}
@@ -161,11 +161,11 @@ class TestStructuredPrompt(unittest.TestCase):
         """Test that [previous_context] tag is properly detected."""
         messages = [
             # These should be detected as previous context
-            ChatMessage(role="system", content="[previous_context]\nOld stuff"),
-            ChatMessage(role="system", content="[previous_context] More old"),
+            _msg("system", "[previous_context]\nOld stuff"),
+            _msg("system", "[previous_context] More old"),
             # These should be current session
-            ChatMessage(role="user", content="Not previous context"),
-            ChatMessage(role="assistant", content="Also not [previous_context] in middle")
+            _msg("user", "Not previous context"),
+            _msg("assistant", "Also not [previous_context] in middle")
         ]
 
         prompts = {}
@@ -184,12 +184,12 @@ class TestStructuredPrompt(unittest.TestCase):
     def test_complex_conversation_structure(self):
         """Test a complex conversation like the 5K example."""
         messages = [
-            ChatMessage(role="system", content="[previous_context]\n# Description\nUser organizing documents"),
-            ChatMessage(role="system", content="Recent entries:\n{\"entries\": []}"),
-            ChatMessage(role="user", content="I'm training for a 5K run. My personal best is 25:50"),
-            ChatMessage(role="assistant", content="Great! Here are training tips..."),
-            ChatMessage(role="user", content="Should I focus on intervals?"),
-            ChatMessage(role="assistant", content="Yes, intervals will help...")
+            _msg("system", "[previous_context]\n# Description\nUser organizing documents"),
+            _msg("system", "Recent entries:\n{\"entries\": []}"),
+            _msg("user", "I'm training for a 5K run. My personal best is 25:50"),
+            _msg("assistant", "Great! Here are training tips..."),
+            _msg("user", "Should I focus on intervals?"),
+            _msg("assistant", "Yes, intervals will help...")
         ]
 
         prompts = {
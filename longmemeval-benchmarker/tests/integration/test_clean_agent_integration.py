@@ -1,102 +1,92 @@
 """Integration test for the clean agent implementation."""
 
 import unittest
-from unittest.mock import Mock, MagicMock, patch
-import sys
-from pathlib import Path
+from unittest.mock import DEFAULT, AsyncMock, Mock, patch
 
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-
-from langchain_core.messages import ChatMessage, AIMessage, ToolMessage
+import pytest
+from langchain_core.messages import ToolMessage
 
 from src.mycelian_memory_agent.agent import MycelianMemoryAgent
 from src.mycelian_memory_agent.agent_invoker import MycelianAgentInvoker
 from src.mycelian_memory_agent.control_state import ControlState
 
+# Tool arguments the shared agent is expected to send
+_CTX_ARGS = {"vault_id": "vault_123", "memory_id": "memory_456"}
+_LIST_ARGS = {**_CTX_ARGS, "limit": 10}
+
+# Canned result for each tool, in the order the agent is given them
+_TOOL_RESULTS = {
+    "get_context": "# Previous Context\n- User is Alice\n- Working on recommendation systems",
+    "list_entries": "Entry 1: Alice discussed cold start problem\nEntry 2: Explored hybrid approaches",
+    "add_entry": "Entry added successfully",
+    "await_consistency": "consistent",
+    "put_context": "Context saved",
+}
+
+
+def _make_tool(name, result):
+    """Build a tool mock restricted to the name/invoke surface the agent uses."""
+    tool = Mock(spec=["name", "invoke"])
+    tool.name = name
+    tool.invoke.return_value = result
+    return tool
+
 
+@pytest.mark.integration
 class TestCleanAgentIntegration(unittest.TestCase):
     """Integration test for the clean agent implementation."""
 
-    def setUp(self):
-        """Set up mock environment for integration testing."""
+    @classmethod
+    def setUpClass(cls):
+        """Build the mock environment once and patch the graph plumbing for the whole class."""
         # Mock LLM
-        self.mock_llm = Mock()
-        self.mock_llm_with_tools = Mock()
-        self.mock_llm.bind_tools = Mock(return_value=self.mock_llm_with_tools)
+        cls.mock_llm = Mock()
+        cls.mock_llm_with_tools = Mock()
+        cls.mock_llm.bind_tools = Mock(return_value=cls.mock_llm_with_tools)
 
         # Mock tools with realistic behavior
-        self.mock_get_context = Mock(name="get_context")
-        self.mock_get_context.name = "get_context"
-        self.mock_get_context.invoke = Mock(return_value="# Previous Context\n- User is Alice\n- Working on recommendation systems")
-
-        self.mock_list_entries = Mock(name="list_entries")
-        self.mock_list_entries.name = "list_entries"
-        self.mock_list_entries.invoke = Mock(return_value="Entry 1: Alice discussed cold start problem\nEntry 2: Explored hybrid approaches")
-
-        self.mock_add_entry = Mock(name="add_entry")
-        self.mock_add_entry.name = "add_entry"
-        self.mock_add_entry.invoke = Mock(return_value="Entry added successfully")
-
-        self.mock_await_consistency = Mock(name="await_consistency")
-        self.mock_await_consistency.name = "await_consistency"
-        self.mock_await_consistency.invoke = Mock(return_value="consistent")
-
-        self.mock_put_context = Mock(name="put_context")
-        self.mock_put_context.name = "put_context"
-        self.mock_put_context.invoke = Mock(return_value="Context saved")
-
-        self.tools = [
-            self.mock_get_context,
-            self.mock_list_entries,
-            self.mock_add_entry,
-            self.mock_await_consistency,
-            self.mock_put_context
-        ]
+        cls.tools = [_make_tool(name, result) for name, result in _TOOL_RESULTS.items()]
+        (cls.mock_get_context, cls.mock_list_entries, cls.mock_add_entry,
+         cls.mock_await_consistency, cls.mock_put_context) = cls.tools
 
         # Mock prompts
-        self.prompts = {
+        cls.prompts = {
             "entry_capture_prompt": "Capture entry following rules",
             "summary_prompt": "Generate summary in past tense",
             "context_prompt": "Maintain context document"
         }
 
-    @patch('src.mycelian_memory_agent.agent.StateGraph')
-    @patch('src.mycelian_memory_agent.agent.MemorySaver')
-    @patch('src.mycelian_memory_agent.agent.ToolNode')
-    def test_full_session_flow(self, mock_tool_node, mock_memory_saver, mock_state_graph):
-        """Test a complete session flow with the invoker."""
-        # Setup mock graph
-        mock_graph = Mock()
-        mock_graph.invoke = Mock(return_value={"status": "complete"})
-        mock_workflow = Mock()
-        mock_workflow.compile = Mock(return_value=mock_graph)
-        mock_state_graph.return_value = mock_workflow
-
-        # Create agent and invoker
-        agent = MycelianMemoryAgent(
-            llm=self.mock_llm,
-            tools=self.tools,
-            prompts=self.prompts,
-            vault_id="test_vault",
-            memory_id="test_memory"
+        # One class-wide patch instead of per-test decorator stacks
+        graph_patch = patch.multiple(
+            'src.mycelian_memory_agent.agent',
+            StateGraph=DEFAULT, MemorySaver=DEFAULT, ToolNode=DEFAULT
+        )
+        cls.graph_mocks = graph_patch.start()
+        cls.addClassCleanup(graph_patch.stop)
+
+        # One agent shared by every test; its compiled graph is a mock
+        cls.mock_graph = Mock()
+        cls.graph_mocks["StateGraph"].return_value.compile.return_value = cls.mock_graph
+        cls.agent = MycelianMemoryAgent(
+            llm=cls.mock_llm,
+            tools=cls.tools,
+            prompts=cls.prompts,
+            **_CTX_ARGS
         )
-        invoker = MycelianAgentInvoker(agent)
 
-        thread_id = "test_thread_001"
+    def setUp(self):
+        """Reset call records on the shared mocks so assertions stay per-test."""
+        for mock in (self.mock_llm, self.mock_llm_with_tools, *self.tools, *self.graph_mocks.values()):
+            mock.reset_mock()
+        self.mock_graph.ainvoke = AsyncMock(return_value={"status": "complete"})
 
-        # 1. Start session
-        invoker.start_session(thread_id)
+    def test_full_session_flow(self):
+        """Test a complete session flow with the invoker."""
+        invoker = MycelianAgentInvoker(self.agent, flush_every=6)
 
-        # Verify START_SESSION was invoked
-        self.assertEqual(mock_graph.invoke.call_count, 1)
-        call_args = mock_graph.invoke.call_args_list[0]
-        state = call_args[0][0]
-        config = call_args[0][1]
-        self.assertEqual(state["control"], ControlState.START_SESSION)
-        self.assertEqual(config["configurable"]["thread_id"], thread_id)
+        thread_id = "test_thread_001"
 
-        # 2. Process 7 messages to test flush
+        # Start session, process 7 messages (the 6th triggers a flush), end session
         messages = [
             ("user", "Hi, I'm Alice"),
             ("assistant", "Hello Alice!"),
@@ -106,49 +96,29 @@ class TestCleanAgentIntegration(unittest.TestCase):
             ("assistant", "Indeed, it's a common issue"),  # 6th message - should flush
             ("user", "Any suggestions?")  # 7th message
         ]
-
-        for i, (role, content) in enumerate(messages, 1):
-            mock_graph.invoke.reset_mock()
+        invoker.start_session(thread_id)
+        for role, content in messages:
             invoker.process_conversation_message(role, content, thread_id)
-
-            # Check the control state
-            call_args = mock_graph.invoke.call_args
-            state = call_args[0][0]
-
-            if i == 6:
-                # 6th message should trigger flush
-                self.assertEqual(state["control"], ControlState.PROCESS_MESSAGE_AND_FLUSH)
-            else:
-                self.assertEqual(state["control"], ControlState.PROCESS_MESSAGE)
-
-            # Verify message was passed correctly
-            self.assertEqual(len(state["to_process"]), 1)
-            msg = state["to_process"][0]
-            self.assertIsInstance(msg, ChatMessage)
-            self.assertEqual(msg.role, role)
-            self.assertEqual(msg.content, content)
-
-        # 3. End session
-        mock_graph.invoke.reset_mock()
         invoker.end_session(thread_id)
 
-        call_args = mock_graph.invoke.call_args
-        state = call_args[0][0]
-        self.assertEqual(state["control"], ControlState.END_SESSION)
-        self.assertEqual(state["to_process"], [])
+        # Inspect every graph invocation in one pass against the expected
+        # (control, [(role, content), ...]) sequence
+        recorded = [c.args for c in self.mock_graph.ainvoke.call_args_list]
+        expected = [
+            (ControlState.START_SESSION, []),
+            *[(ControlState.PROCESS_MESSAGE, [message]) for message in messages[:6]],
+            (ControlState.FLUSH, []),
+            (ControlState.PROCESS_MESSAGE, [messages[6]]),
+            (ControlState.END_SESSION, []),
+        ]
+        actual = [(state["control"], [(msg.role, msg.content) for msg in state["to_process"]])
+                  for state, _ in recorded]
+        self.assertEqual(actual, expected)
+        self.assertEqual({config["configurable"]["thread_id"] for _, config in recorded}, {thread_id})
 
-    @patch('src.mycelian_memory_agent.agent.MemorySaver')
-    @patch('src.mycelian_memory_agent.agent.ToolNode')
-    def test_observe_logic_with_real_tools(self, mock_tool_node, mock_memory_saver):
+    def test_observe_logic_with_real_tools(self):
         """Test the observe method with more realistic tool interactions."""
-        # Create agent
-        agent = MycelianMemoryAgent(
-            llm=self.mock_llm,
-            tools=self.tools,
-            prompts=self.prompts,
-            vault_id="vault_123",
-            memory_id="memory_456"
-        )
+        agent = self.agent
 
         # Test START_SESSION sequence
         state = {
@@ -160,10 +130,7 @@ class TestCleanAgentIntegration(unittest.TestCase):
 
         # First call - should get_context
         result = agent.observe(state)
-        self.mock_get_context.invoke.assert_called_once_with({
-            "vault_id": "vault_123",
-            "memory_id": "memory_456"
-        })
+        self.mock_get_context.invoke.assert_called_once_with(_CTX_ARGS)
         self.assertIn("tool_history", result)
         self.assertEqual(len(result["tool_history"]), 1)
 
@@ -174,11 +141,7 @@ class TestCleanAgentIntegration(unittest.TestCase):
 
         # Second call - should list_entries
         result = agent.observe(state)
-        self.mock_list_entries.invoke.assert_called_once_with({
-            "vault_id": "vault_123",
-            "memory_id": "memory_456",
-            "limit": 10
-        })
+        self.mock_list_entries.invoke.assert_called_once_with(_LIST_ARGS)
 
         # Should update conversation_history
         self.assertIn("conversation_history", result)
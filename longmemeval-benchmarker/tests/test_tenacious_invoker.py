@@ -1,18 +1,39 @@
 """Tests for tenacious_agent_invoker with mock providers and fast clock."""
 
+import asyncio
+import logging
 import unittest
-from unittest.mock import Mock, patch, call
+from unittest.mock import AsyncMock, Mock, patch, call
 import time
 from typing import List
 
 from src.tenacious_agent_invoker import (
     invoke_with_backoff,
-    is_retryable_openai_error,
+    ainvoke_with_backoff,
+    is_retryable_llm_error,
     backoff_schedule_from_env,
+    retry_after_from_error,
+    response_cache_key,
+    ResponseCache,
     DEFAULT_BACKOFF_SCHEDULE
 )
 
 
+class _FakeCall:
+    """Minimal stand-in for Mock(side_effect=[...]): raises or returns each result in turn."""
+
+    def __init__(self, results):
+        self._results = iter(results)
+        self.call_count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.call_count += 1
+        result = next(self._results)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
 class TestTenaciousInvoker(unittest.TestCase):
     """Test the tenacious invoker with mock providers."""
 
@@ -30,58 +51,65 @@ class TestTenaciousInvoker(unittest.TestCase):
         """Mock logger that records messages."""
         self.log_calls.append(msg)
 
-    def test_is_retryable_openai_error(self):
+    def test_is_retryable_llm_error(self):
         """Test error classification for OpenAI errors."""
         # Rate limit errors
-        self.assertTrue(is_retryable_openai_error(Exception("Rate limit exceeded")))
-        self.assertTrue(is_retryable_openai_error(Exception("Error 429: Too many requests")))
+        self.assertTrue(is_retryable_llm_error(Exception("Rate limit exceeded")))
+        self.assertTrue(is_retryable_llm_error(Exception("Error 429: Too many requests")))
 
         # Server errors
-        self.assertTrue(is_retryable_openai_error(Exception("Internal server error 500")))
-        self.assertTrue(is_retryable_openai_error(Exception("Bad gateway 502")))
-        self.assertTrue(is_retryable_openai_error(Exception("Service unavailable 503")))
+        self.assertTrue(is_retryable_llm_error(Exception("Internal server error 500")))
+        self.assertTrue(is_retryable_llm_error(Exception("Bad gateway 502")))
+        self.assertTrue(is_retryable_llm_error(Exception("Service unavailable 503")))
 
         # Timeout/connection errors
-        self.assertTrue(is_retryable_openai_error(Exception("Request timeout")))
-        self.assertTrue(is_retryable_openai_error(Exception("Connection error")))
+        self.assertTrue(is_retryable_llm_error(Exception("Request timeout")))
+        self.assertTrue(is_retryable_llm_error(Exception("Connection error")))
 
         # LangChain model provider error (our addition)
-        self.assertTrue(is_retryable_openai_error(
+        self.assertTrue(is_retryable_llm_error(
             ValueError("Unable to infer model provider for model='gpt-5-nano-2025-08-07'")
         ))
 
         # Non-retryable errors
-        self.assertFalse(is_retryable_openai_error(Exception("Invalid API key")))
-        self.assertFalse(is_retryable_openai_error(Exception("Model not found")))
-        self.assertFalse(is_retryable_openai_error(Exception("Insufficient_quota")))
+        self.assertFalse(is_retryable_llm_error(Exception("Invalid API key")))
+        self.assertFalse(is_retryable_llm_error(Exception("Model not found")))
+        self.assertFalse(is_retryable_llm_error(Exception("Insufficient_quota")))
 
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_successful_call_no_retry(self, mock_sleep):
-        """Test that successful calls don't trigger retries."""
-        mock_sleep.side_effect = self.mock_sleep
+        # Status codes carried on the exception or its response
+        status_error = Exception("Request failed")
+        status_error.status_code = 503
+        self.assertTrue(is_retryable_llm_error(status_error))
+
+        response_error = Exception("Request failed")
+        response_error.response = Mock(status_code=429)
+        self.assertTrue(is_retryable_llm_error(response_error))
 
+        client_error = Exception("Request failed")
+        client_error.status_code = 400
+        self.assertFalse(is_retryable_llm_error(client_error))
+
+    def test_successful_call_no_retry(self):
+        """Test that successful calls don't trigger retries."""
         mock_fn = Mock(return_value="success")
 
-        result = invoke_with_backoff(mock_fn, log=self.mock_log)
+        result = invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertEqual(result, "success")
         self.assertEqual(mock_fn.call_count, 1)
         self.assertEqual(len(self.sleep_calls), 0)  # No sleeps for success
         self.assertEqual(len(self.log_calls), 0)  # No logs for success
 
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_retryable_error_with_recovery(self, mock_sleep):
+    def test_retryable_error_with_recovery(self):
         """Test retry logic with eventual success."""
-        mock_sleep.side_effect = self.mock_sleep
-
         # Fail twice with rate limit, then succeed
-        mock_fn = Mock(side_effect=[
+        mock_fn = _FakeCall([
             Exception("Error 429: Rate limit exceeded"),
             Exception("Error 429: Rate limit exceeded"),
             "success"
         ])
 
-        result = invoke_with_backoff(mock_fn, debug=True, log=self.mock_log)
+        result = invoke_with_backoff(mock_fn, debug=True, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertEqual(result, "success")
         self.assertEqual(mock_fn.call_count, 3)
@@ -96,30 +124,40 @@ class TestTenaciousInvoker(unittest.TestCase):
         self.assertIn("retry 1/6", self.log_calls[0])
         self.assertIn("retry 2/6", self.log_calls[1])
 
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_non_retryable_error_immediate_failure(self, mock_sleep):
-        """Test that non-retryable errors fail immediately."""
-        mock_sleep.side_effect = self.mock_sleep
+    def test_structured_retry_logging(self):
+        """Test a Logger receives llm_retry records with details in extra."""
+        mock_logger = Mock(spec=logging.Logger)
+        mock_fn = _FakeCall([Exception("Error 429: Rate limit exceeded"), "success"])
+
+        result = invoke_with_backoff(mock_fn, log=mock_logger, sleep=self.mock_sleep)
 
-        mock_fn = Mock(side_effect=Exception("Invalid API key"))
+        self.assertEqual(result, "success")
+        mock_logger.info.assert_called_once()
+        self.assertEqual(mock_logger.info.call_args.args, ("llm_retry",))
+        extra = mock_logger.info.call_args.kwargs["extra"]
+        self.assertEqual(extra["error_type"], "Exception")
+        self.assertEqual(extra["attempt"], 1)
+        self.assertEqual(extra["max_attempts"], 6)
+        self.assertEqual(extra["sleep_seconds"], self.sleep_calls[0])
+
+    def test_non_retryable_error_immediate_failure(self):
+        """Test that non-retryable errors fail immediately."""
+        mock_fn = _FakeCall([Exception("Invalid API key")])
 
         with self.assertRaises(Exception) as ctx:
-            invoke_with_backoff(mock_fn, log=self.mock_log)
+            invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertIn("Invalid API key", str(ctx.exception))
         self.assertEqual(mock_fn.call_count, 1)  # Only one attempt
         self.assertEqual(len(self.sleep_calls), 0)  # No retries
 
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_exhausted_retries(self, mock_sleep):
+    def test_exhausted_retries(self):
         """Test that persistent errors eventually fail after all retries."""
-        mock_sleep.side_effect = self.mock_sleep
-
         # Always fail with rate limit
-        mock_fn = Mock(side_effect=Exception("Error 429: Rate limit exceeded"))
+        mock_fn = _FakeCall([Exception("Error 429: Rate limit exceeded")] * 6)
 
         with self.assertRaises(Exception) as ctx:
-            invoke_with_backoff(mock_fn, log=self.mock_log)
+            invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertIn("429", str(ctx.exception))
         # 1 initial attempt + 5 retries (default schedule length)
@@ -133,34 +171,28 @@ class TestTenaciousInvoker(unittest.TestCase):
                                  msg=f"Sleep {i} duration mismatch")
 
     @patch.dict('os.environ', {'LME_LLM_BACKOFF_SCHEDULE': '1,2,3'})
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_custom_backoff_schedule(self, mock_sleep):
+    def test_custom_backoff_schedule(self):
         """Test custom backoff schedule from environment."""
-        mock_sleep.side_effect = self.mock_sleep
-
         # Verify schedule is loaded from env
         schedule = backoff_schedule_from_env()
         self.assertEqual(schedule, [1.0, 2.0, 3.0])
 
         # Test with custom schedule
-        mock_fn = Mock(side_effect=[
+        mock_fn = _FakeCall([
             Exception("Error 429"),
             Exception("Error 429"),
             "success"
         ])
 
-        result = invoke_with_backoff(mock_fn, log=self.mock_log)
+        result = invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertEqual(result, "success")
         self.assertEqual(len(self.sleep_calls), 2)
         self.assertAlmostEqual(self.sleep_calls[0], 1.0, delta=0.3)  # ~1s
         self.assertAlmostEqual(self.sleep_calls[1], 2.0, delta=0.5)  # ~2s
 
-    @patch('src.tenacious_agent_invoker._time.sleep')
-    def test_langchain_model_provider_error_retryable(self, mock_sleep):
+    def test_langchain_model_provider_error_retryable(self):
         """Test that LangChain model provider errors are retried."""
-        mock_sleep.side_effect = self.mock_sleep
-
         # Simulate the specific LangChain error
         langchain_error = ValueError(
             "Unable to infer model provider for model='gpt-5-nano-2025-08-07', "
@@ -168,14 +200,139 @@ class TestTenaciousInvoker(unittest.TestCase):
         )
 
         # Fail once with LangChain error, then succeed
-        mock_fn = Mock(side_effect=[langchain_error, "success"])
+        mock_fn = _FakeCall([langchain_error, "success"])
 
-        result = invoke_with_backoff(mock_fn, log=self.mock_log)
+        result = invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
 
         self.assertEqual(result, "success")
         self.assertEqual(mock_fn.call_count, 2)
         self.assertEqual(len(self.sleep_calls), 1)  # One retry
 
+    def test_retry_after_header_overrides_schedule(self):
+        """Test that a Retry-After header replaces the scheduled wait."""
+        rate_limited = Exception("Error 429: Rate limit exceeded")
+        rate_limited.response = Mock(headers={"Retry-After": "2"})
+
+        mock_fn = _FakeCall([rate_limited, "success"])
+
+        result = invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
+
+        self.assertEqual(result, "success")
+        self.assertEqual(len(self.sleep_calls), 1)
+        # Server hint is never undercut by jitter
+        self.assertGreaterEqual(self.sleep_calls[0], 2.0)
+        self.assertLessEqual(self.sleep_calls[0], 2.0 * 1.15)
+
+    @patch.dict('os.environ', {'LME_LLM_BACKOFF_SCHEDULE': '1,2,3'})
+    def test_retry_after_header_capped_at_longest_scheduled_wait(self):
+        """Test that an oversized Retry-After hint is clamped to max(schedule)."""
+        rate_limited = Exception("Error 429: Rate limit exceeded")
+        rate_limited.response = Mock(headers={"Retry-After": "86400"})
+
+        mock_fn = _FakeCall([rate_limited, "success"])
+
+        result = invoke_with_backoff(mock_fn, log=self.mock_log, sleep=self.mock_sleep)
+
+        self.assertEqual(result, "success")
+        self.assertEqual(self.sleep_calls, [3.0])
+
+    @patch('src.tenacious_agent_invoker._asyncio.sleep', new_callable=AsyncMock)
+    def test_async_retry_with_recovery(self, mock_sleep):
+        """Test the async variant retries and awaits non-blocking sleeps."""
+        mock_sleep.side_effect = self.mock_sleep
+
+        mock_fn = AsyncMock(side_effect=[
+            Exception("Error 429: Rate limit exceeded"),
+            "success"
+        ])
+
+        result = asyncio.run(ainvoke_with_backoff(mock_fn, log=self.mock_log))
+
+        self.assertEqual(result, "success")
+        self.assertEqual(mock_fn.await_count, 2)
+        self.assertEqual(len(self.sleep_calls), 1)
+        self.assertAlmostEqual(self.sleep_calls[0], 5.0, delta=1.0)
+        self.assertIn("retry 1/6", self.log_calls[0])
+
+    @patch('src.tenacious_agent_invoker._asyncio.sleep', new_callable=AsyncMock)
+    def test_async_non_retryable_error_immediate_failure(self, mock_sleep):
+        """Test the async variant raises non-retryable errors without sleeping."""
+        mock_fn = AsyncMock(side_effect=Exception("Invalid API key"))
+
+        with self.assertRaises(Exception):
+            asyncio.run(ainvoke_with_backoff(mock_fn))
+
+        self.assertEqual(mock_fn.await_count, 1)
+        mock_sleep.assert_not_called()
+
+    def test_response_cache_skips_call_on_hit(self):
+        """Test that a cached response is returned without invoking the model."""
+        cache = ResponseCache()
+        key = response_cache_key("gpt", [{"role": "user", "content": "hi"}])
+
+        mock_fn = Mock(return_value="answer")
+
+        self.assertEqual(invoke_with_backoff(mock_fn, cache_key=key, cache=cache), "answer")
+        self.assertEqual(invoke_with_backoff(mock_fn, cache_key=key, cache=cache), "answer")
+        self.assertEqual(mock_fn.call_count, 1)
+
+        # Different request misses
+        other = response_cache_key("gpt", [{"role": "user", "content": "bye"}])
+        invoke_with_backoff(mock_fn, cache_key=other, cache=cache)
+        self.assertEqual(mock_fn.call_count, 2)
+
+        # No key means no caching
+        invoke_with_backoff(mock_fn)
+        self.assertEqual(mock_fn.call_count, 3)
+
+    def test_response_cache_does_not_store_failures(self):
+        """Test that non-retryable failures are not cached."""
+        cache = ResponseCache()
+        mock_fn = _FakeCall([Exception("Invalid API key"), "answer"])
+
+        with self.assertRaises(Exception):
+            invoke_with_backoff(mock_fn, cache_key="k", cache=cache)
+        self.assertEqual(len(cache), 0)
+
+        self.assertEqual(invoke_with_backoff(mock_fn, cache_key="k", cache=cache), "answer")
+
+    def test_response_cache_evicts_least_recently_used(self):
+        """Test that the cache stays bounded and evicts the oldest entry."""
+        cache = ResponseCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_retry_after_from_error(self):
+        """Test parsing of server-provided retry hints."""
+        # No hint
+        self.assertIsNone(retry_after_from_error(Exception("boom")))
+
+        # retry_after attribute
+        exc = Exception("429")
+        exc.retry_after = 7
+        self.assertEqual(retry_after_from_error(exc), 7.0)
+
+        # Retry-After header as seconds
+        exc = Exception("429")
+        exc.response = Mock(headers={"Retry-After": "1.5"})
+        self.assertEqual(retry_after_from_error(exc), 1.5)
+
+        # Retry-After header as HTTP-date in the past clamps to zero
+        exc = Exception("429")
+        exc.response = Mock(headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        self.assertEqual(retry_after_from_error(exc), 0.0)
+
+        # Unparseable header is ignored
+        exc = Exception("429")
+        exc.response = Mock(headers={"Retry-After": "soon"})
+        self.assertIsNone(retry_after_from_error(exc))
+
     def test_backoff_schedule_from_env_edge_cases(self):
         """Test edge cases for environment variable parsing."""
         # Empty env var
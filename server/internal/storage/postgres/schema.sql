@@ -11,6 +11,8 @@ CREATE TABLE IF NOT EXISTS vaults (
   PRIMARY KEY (actor_id, vault_id),
   UNIQUE (actor_id, title)
 );
+-- Title lookups without an actor (e.g. tools/delete_vault_memories.py --by-title)
+CREATE INDEX IF NOT EXISTS vaults_title_idx ON vaults(title);
 
 -- Memories
 CREATE TABLE IF NOT EXISTS memories (